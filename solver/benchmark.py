@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Benchmark the CP-SAT engines, ConstraintSolver and SimpleSolver on synthetic instances"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import subprocess
+import sys
+import time
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional
+
+from instance_generator import SIZES, InstanceSpec, generate_instance
+from evaluation import evaluate_penalties
+
+ENGINES = ['cp-sat', 'cp-sat-seeded', 'cp-sat-flat', 'two-stage', 'compact', 'greedy', 'simple']
+# solver_options each CP-SAT engine adds; cp-sat-flat is the model without room pools or symmetry breaking
+CP_SAT_ENGINES = {
+    'cp-sat': {'formulation': 'rooms'},
+    'cp-sat-seeded': {'formulation': 'rooms', 'greedy_hint': True},
+    'cp-sat-flat': {'formulation': 'rooms', 'room_pools': False, 'symmetry_breaking': False},
+    'two-stage': {'formulation': 'two_stage'},
+    'compact': {'formulation': 'compact'},
+}
+# Speedups reported per size as (engine, baseline engine)
+SPEEDUPS = [('cp-sat', 'cp-sat-flat'), ('two-stage', 'cp-sat-flat'), ('compact', 'cp-sat'),
+            ('cp-sat-seeded', 'cp-sat')]
+METRICS = ['build_time', 'solve_time', 'first_solution_time', 'peak_rss_mb', 'assignments', 'objective',
+           'evaluated_penalty']
+
+
+def _peak_rss_mb() -> float:
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _run_engine(engine: str, data: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one engine on one instance; called in a fresh process so peak RSS is per run"""
+    start = time.perf_counter()
+    if engine in CP_SAT_ENGINES:
+        from model import SolverInput, create_solver
+        payload = dict(data, solver_options=dict(options, **CP_SAT_ENGINES[engine]))
+        solver = create_solver(SolverInput(**payload))
+        output = solver.solve()
+        timings = output.stats['timings']
+        build_time = sum(timings.get(phase, 0) for phase in
+                         ['screening', 'greedy_hint', 'create_variables', 'add_hard_constraints',
+                          'add_soft_objectives'])
+        solve_time = timings.get('search', 0) + timings.get('extraction', 0)
+        assignments = output.assignments
+        objective = output.objective
+        search = output.stats['search']
+        # From the start of the run, so a seeded run pays for its greedy pass
+        first = search.get('first_solution_time')
+        extra = {
+            'model': output.stats.get('model'),
+            'status': search['status'],
+            'first_solution_time': round(build_time + first, 4) if first is not None else None,
+            'progress': search.get('progress', []),
+        }
+    else:
+        if engine == 'greedy':
+            from advanced_solver import ConstraintSolver as Engine
+        else:
+            from simple_solver import SimpleSolver as Engine
+        solver = Engine(data)
+        build_time = time.perf_counter() - start
+        solve_start = time.perf_counter()
+        result = solver.solve()
+        solve_time = time.perf_counter() - solve_start
+        assignments = result['assignments']
+        objective = None
+        extra = {}
+
+    evaluation = evaluate_penalties(data, assignments)
+    return {
+        'build_time': round(build_time, 4),
+        'solve_time': round(solve_time, 4),
+        'wall_time': round(time.perf_counter() - start, 4),
+        'peak_rss_mb': _peak_rss_mb(),
+        'assignments': len(assignments),
+        'objective': objective,
+        'evaluated_penalty': evaluation['total'],
+        'hard_violations': evaluation['hard_violations'],
+        **extra,
+    }
+
+
+def _run_isolated(engine: str, data: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(1) as pool:
+        try:
+            return pool.apply(_run_engine, (engine, data, options))
+        except Exception as e:
+            return {'error': f"{type(e).__name__}: {e}"}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes: List[str], engines: List[str], seed: int = 0,
+                   options: Optional[Dict[str, Any]] = None,
+                   availability: Optional[float] = None) -> Dict[str, Any]:
+    options = options or {}
+    runs = []
+    for size in sizes:
+        spec = InstanceSpec(**dict(asdict(SIZES[size]), seed=seed))
+        if availability is not None:
+            spec.availability = availability
+        data = generate_instance(spec)
+        required = sum(o['course']['L'] + o['course']['T'] + o['course']['P'] for o in data['offerings'])
+        for engine in engines:
+            print(f"{size:>10} {engine:>11} ...", end='', file=sys.stderr, flush=True)
+            result = _run_isolated(engine, data, options)
+            print(f" {result.get('wall_time', result.get('error'))}", file=sys.stderr)
+            runs.append({'size': size, 'engine': engine, 'required_sessions': required, **result})
+    return {
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'seed': seed,
+        'availability': availability,
+        'solver_options': options,
+        'runs': runs,
+        'speedups': speedups(runs),
+    }
+
+
+def speedups(runs: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Build, solve and first-solution time of each baseline engine divided by the engine's, per size"""
+    by_key = {(r['size'], r['engine']): r for r in runs}
+    result = {}
+    for run in runs:
+        for engine, baseline in SPEEDUPS:
+            if run['engine'] != engine or (run['size'], baseline) not in by_key:
+                continue
+            base = by_key[(run['size'], baseline)]
+            entry = {}
+            for metric in ['build_time', 'solve_time', 'first_solution_time']:
+                if run.get(metric) and base.get(metric) is not None:
+                    entry[metric] = round(base[metric] / run[metric], 2)
+            entry['status'] = [base.get('status'), run.get('status')]
+            entry['evaluated_penalty'] = [base.get('evaluated_penalty'), run.get('evaluated_penalty')]
+            result.setdefault(run['size'], {})[f"{engine} vs {baseline}"] = entry
+    return result
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """One line per (size, engine, metric) present in both result files"""
+    before = {(r['size'], r['engine']): r for r in baseline['runs']}
+    lines = [f"{'size':>10} {'engine':>11} {'metric':>18} {'baseline':>12} {'current':>12} {'change':>8}"]
+    for run in current['runs']:
+        old = before.get((run['size'], run['engine']))
+        if old is None:
+            continue
+        for metric in METRICS:
+            a, b = old.get(metric), run.get(metric)
+            if not isinstance(a, (int, float)) or not isinstance(b, (int, float)):
+                continue
+            change = f"{(b - a) / a * 100:+.1f}%" if a else ''
+            lines.append(f"{run['size']:>10} {run['engine']:>11} {metric:>18} {a:>12} {b:>12} {change:>8}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='seed,small', help=f"Comma-separated, from {sorted(SIZES)}")
+    parser.add_argument('--engines', default=','.join(ENGINES), help=f"Comma-separated, from {ENGINES}")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--availability', type=float,
+                        help='Probability a teacher can teach a given slot; lower gives sparser instances')
+    parser.add_argument('--time-limit', type=float, help='CP-SAT time limit per run')
+    parser.add_argument('--linearization-level', type=int, help='CP-SAT linearization_level per run')
+    parser.add_argument('--output', '-o', help='Write JSON results here')
+    parser.add_argument('--compare', help='Earlier results JSON to compare against')
+    args = parser.parse_args()
+
+    options = {'time_limit': args.time_limit} if args.time_limit else {}
+    if args.linearization_level is not None:
+        options['linearization_level'] = args.linearization_level
+    results = run_benchmarks(args.sizes.split(','), args.engines.split(','), args.seed, options,
+                             args.availability)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print('\n'.join(compare(baseline, results)), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
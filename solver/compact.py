@@ -0,0 +1,262 @@
+"""Compact engine: one integer slot variable per session, AllDifferent for clashes"""
+
+import logging
+from typing import Callable, Dict, List, Tuple
+
+from ortools.sat.python import cp_model
+
+from model import TimetableSolver
+from variables import KINDS, KIND_INDEX
+
+logger = logging.getLogger(__name__)
+
+
+class CompactSolver(TimetableSolver):
+    """TimetableSolver with sessions as slot indices instead of a boolean tensor.
+
+    Every lecture or tutorial hour is an integer variable over the slots its
+    teacher can take, paired with a room-class variable over the room pools
+    large enough for it; every lab is a cluster variable paired with a lab
+    pool variable. Teacher and section clashes are AllDifferent constraints
+    and each pool is a cumulative resource, as wide as its number of rooms,
+    along the slot (or cluster) axis.
+
+    The soft objective needs per-slot occupancy, so each offering and kind
+    also keeps one literal per candidate slot, filed in the VariableStore as
+    X[offering, slot, None, kind] (Y[offering, cluster, None] for labs).
+    An element constraint sets the literal at each unit's slot, and exactly
+    as many literals as units are true, so the penalty terms are the same
+    as TimetableSolver's.
+    """
+
+    def __init__(self, input_data, fixed_assignments=None):
+        super().__init__(input_data, fixed_assignments)
+        self.sessions: Dict[Tuple[int, int], List[Tuple[cp_model.IntVar, cp_model.IntVar]]] = {}
+        self.labs: Dict[int, Tuple[cp_model.IntVar, cp_model.IntVar]] = {}
+        self.free_units: Dict[Tuple[int, int], List[cp_model.IntVar]] = {}
+        self.slot_intervals: Dict[int, List[cp_model.IntervalVar]] = {}
+        self.cluster_intervals: Dict[int, List[cp_model.IntervalVar]] = {}
+        # (offering, kind, unit) -> room of the locked assignment that pins it
+        self.locked_rooms: Dict[Tuple[int, int, int], int] = {}
+
+    def create_variables(self):
+        store = self.store
+        slot_rooms = self.compute_slot_room_domains()
+        fixed_ids = {a['offering_id'] for a in self.fixed_assignments}
+        domains = {o: [(s, r) for s in slots for r in rooms]
+                   for o, (slots, rooms) in slot_rooms.items() if store.offering_ids[o] in fixed_ids}
+        fixed = self._fixed_placements(domains)
+        lab_pools = [r for r, room in enumerate(self.input.rooms)
+                     if room['kind'] == 'LAB' and self.room_pool[r] == r]
+
+        # Locked lectures pin one unit each, even outside the domain
+        locked: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
+        for assignment in self.input.locked_assignments:
+            o, s, pool, k = super()._locked_key(assignment)
+            if None in (o, s, pool, k) or assignment['kind'] == 'P':
+                continue
+            if not self.input.slots[s]['is_lab'] and self.input.rooms[pool]['kind'] == 'CLASS':
+                locked.setdefault((o, k), []).append((s, store.room_index[assignment['room_id']]))
+
+        for o, offering in enumerate(self.input.offerings):
+            course = offering['course']
+            slots, pools = slot_rooms.get(o, ([], []))
+
+            for kind in ('L', 'T'):
+                k = KIND_INDEX[kind]
+                if o in fixed:
+                    pinned = sorted((s, r) for s, r, fk in fixed[o][0] if fk == k)
+                else:
+                    pinned = locked.get((o, k), [])[:course[kind]]
+                if course[kind] <= 0 or not (pinned or (slots and pools)):
+                    continue
+                literals = {s: store.add_x(o, s, None, k)
+                            for s in sorted(set(slots if len(pinned) < course[kind] else []) |
+                                            {s for s, _ in pinned})}
+                for unit in range(course[kind]):
+                    if unit < len(pinned):
+                        s, r = pinned[unit]
+                        if (o, k) in locked and o not in fixed:
+                            self.locked_rooms[(o, k, unit)] = r
+                            if s not in slots:
+                                self.pruning_report['locked_overrides'] += 1
+                        self._add_session(o, k, unit, [s], [self.room_pool[r]], literals)
+                    else:
+                        self.free_units.setdefault((o, k), []).append(
+                            self._add_session(o, k, unit, slots, pools, literals))
+                self.model.Add(cp_model.LinearExpr.sum(list(literals.values())) == course[kind])
+
+            if course['P'] > 0:
+                if o in fixed:
+                    (c, r), = fixed[o][1]
+                    self._add_lab(o, [c], [r])
+                elif store.cluster_names and lab_pools:
+                    self._add_lab(o, list(range(len(store.cluster_names))), lab_pools)
+
+        integers = 2 * (sum(len(units) for units in self.sessions.values()) + len(self.labs))
+        self.pruning_report['created_variables'] = store.num_variables + integers
+        logger.info(f"Created {integers} slot and room-class variables with "
+                    f"{store.num_variables} slot literals")
+
+    def _add_session(self, o: int, k: int, unit: int, slots: List[int], pools: List[int],
+                     literals: Dict[int, cp_model.IntVar]) -> cp_model.IntVar:
+        name = f"{o}_{k}_{unit}"
+        slot = self.model.NewIntVarFromDomain(cp_model.Domain.FromValues(slots), f"slot_{name}")
+        self._link(slot, slots, literals, len(self.input.slots))
+        pool = self._add_room_class(slot, pools, self.slot_intervals, name)
+        self.sessions.setdefault((o, k), []).append((slot, pool))
+        return slot
+
+    def _add_lab(self, o: int, clusters: List[int], pools: List[int]):
+        cluster = self.model.NewIntVarFromDomain(cp_model.Domain.FromValues(clusters), f"cluster_{o}")
+        literals = {c: self.store.add_y(o, c, None) for c in clusters}
+        self._link(cluster, clusters, literals, len(self.store.cluster_names))
+        self.model.AddExactlyOne(list(literals.values()))
+        pool = self._add_room_class(cluster, pools, self.cluster_intervals, f"lab_{o}")
+        self.labs[o] = (cluster, pool)
+
+    def _link(self, var: cp_model.IntVar, values: List[int], literals: Dict[int, cp_model.IntVar], size: int):
+        """The literal of the value var takes is true (an element constraint over all `size` values)"""
+        if len(values) == 1:
+            self.model.Add(literals[values[0]] == 1)
+        else:
+            self.model.AddElement(var, [literals.get(v, 0) for v in range(size)], 1)
+
+    def _channel(self, var: cp_model.IntVar, values: List[int], literals: List[cp_model.IntVar]):
+        """literals[i] is true exactly when var takes values[i]"""
+        for value, literal in zip(values, literals):
+            self.model.Add(var == value).OnlyEnforceIf(literal)
+            self.model.Add(var != value).OnlyEnforceIf(literal.Not())
+        self.model.AddExactlyOne(literals)
+
+    def _add_room_class(self, position: cp_model.IntVar, pools: List[int],
+                        intervals: Dict[int, List[cp_model.IntervalVar]], name: str) -> cp_model.IntVar:
+        """Pool variable over `pools`, with a unit interval at `position` in the chosen pool's resource"""
+        pool = self.model.NewIntVarFromDomain(cp_model.Domain.FromValues(pools), f"pool_{name}")
+        if len(pools) == 1:
+            intervals.setdefault(pools[0], []).append(
+                self.model.NewFixedSizeIntervalVar(position, 1, f"in_{name}_{pools[0]}"))
+            return pool
+        literals = [self.model.NewBoolVar(f"class_{name}_{p}") for p in pools]
+        self._channel(pool, pools, literals)
+        for p, literal in zip(pools, literals):
+            intervals.setdefault(p, []).append(
+                self.model.NewOptionalFixedSizeIntervalVar(position, 1, literal, f"in_{name}_{p}"))
+        return pool
+
+    def add_hard_constraints(self):
+        store = self.store
+
+        # Coverage is structural: every unit takes exactly one slot.
+        # Units of one offering and kind are interchangeable, so keep them in order
+        for units in self.free_units.values():
+            for first, second in zip(units, units[1:]):
+                self.model.Add(first < second)
+
+        # Teacher and section clashes, for lectures/tutorials by slot and labs by cluster
+        teacher_slots, section_slots = {}, {}
+        for (o, _), units in self.sessions.items():
+            for slot, _ in units:
+                if store.offering_teacher[o] is not None:
+                    teacher_slots.setdefault(store.offering_teacher[o], []).append(slot)
+                section_slots.setdefault(store.offering_section[o], []).append(slot)
+        teacher_clusters, section_clusters = {}, {}
+        for o, (cluster, _) in self.labs.items():
+            if store.offering_teacher[o] is not None:
+                teacher_clusters.setdefault(store.offering_teacher[o], []).append(cluster)
+            section_clusters.setdefault(store.offering_section[o], []).append(cluster)
+        for groups in (teacher_slots, section_slots, teacher_clusters, section_clusters):
+            for variables in groups.values():
+                if len(variables) > 1:
+                    self.model.AddAllDifferent(variables)
+
+        self.add_teacher_blackouts()
+
+        # Blacked-out rooms fill their pool's capacity with fixed intervals
+        for s, pool in self._blackout_positions():
+            self.slot_intervals.setdefault(pool, []).append(
+                self.model.NewFixedSizeIntervalVar(s, 1, f"blackout_{s}_{pool}"))
+        for c, pool in self._blackout_positions(clusters=True):
+            self.cluster_intervals.setdefault(pool, []).append(
+                self.model.NewFixedSizeIntervalVar(c, 1, f"blackout_lab_{c}_{pool}"))
+
+        # Each pool holds as many sessions per slot (labs per cluster) as it has rooms
+        for intervals in (self.slot_intervals, self.cluster_intervals):
+            for pool, pool_intervals in intervals.items():
+                capacity = len(self.pool_members[pool])
+                if len(pool_intervals) <= capacity:
+                    continue
+                if capacity == 1:
+                    self.model.AddNoOverlap(pool_intervals)
+                else:
+                    self.model.AddCumulative(pool_intervals, [1] * len(pool_intervals), capacity)
+
+    def _blackout_positions(self, clusters: bool = False) -> List[Tuple[int, int]]:
+        """(slot, pool) once per blacked-out room, or (cluster, pool) once per lab
+        room blacked out in any slot of the cluster"""
+        pairs = self.blackout_pairs()
+        if not clusters:
+            return [(s, self.room_pool[r]) for s, r in sorted(pairs)]
+        blocked = {(self.store.slot_cluster[s], r) for s, r in pairs
+                   if self.store.slot_cluster[s] is not None and self.input.rooms[r]['kind'] == 'LAB'}
+        return [(c, self.room_pool[r]) for c, r in sorted(blocked)]
+
+    def explain_infeasibility(self, time_limit: float = 10.0) -> dict:
+        """Cores from the boolean formulation of the same input.
+
+        AllDifferent and cumulative constraints take no enforcement literals,
+        so the groups cannot be assumed away in this model.
+        """
+        return TimetableSolver(self.input, self.fixed_assignments).explain_infeasibility(time_limit)
+
+    def _locked_key(self, locked: dict) -> Tuple:
+        o, s, _, k = super()._locked_key(locked)
+        return (o, s, None, k)
+
+    def _assignment_var(self, assignment: dict):
+        store = self.store
+        if assignment['kind'] != 'P':
+            return self._locked_var(assignment)
+        s = store.slot_index.get(assignment['slot_id'])
+        c = store.slot_cluster[s] if s is not None else None
+        return store.y.get((store.offering_index.get(assignment['offering_id']), c, None))
+
+    def _extract_assignments(self, value: Callable) -> List[dict]:
+        """Assignments of a solution, with a concrete room picked from each chosen pool"""
+        store = self.store
+        assignments = []
+        taken = self.blackout_pairs()
+
+        # Locked units keep their own room; the others pick from their pool
+        units = []
+        for (o, k), sessions in self.sessions.items():
+            for unit, (slot, pool) in enumerate(sessions):
+                units.append((0 if (o, k, unit) in self.locked_rooms else 1, o, k, unit, slot, pool))
+        for _, o, k, unit, slot, pool in sorted(units, key=lambda item: item[0]):
+            s = value(slot)
+            room = self.locked_rooms.get((o, k, unit))
+            if room is None:
+                room = self._pick_room(o, [s], value(pool), KINDS[k], taken)
+            else:
+                taken.add((s, room))
+            assignments.append({
+                'offering_id': store.offering_ids[o],
+                'slot_id': store.slot_ids[s],
+                'room_id': store.room_ids[room],
+                'kind': KINDS[k],
+                'is_locked': False
+            })
+
+        for o, (cluster, pool) in self.labs.items():
+            slots = store.cluster_slots[value(cluster)]
+            room = self._pick_room(o, slots, value(pool), 'P', taken)
+            for s in slots:
+                assignments.append({
+                    'offering_id': store.offering_ids[o],
+                    'slot_id': store.slot_ids[s],
+                    'room_id': store.room_ids[room],
+                    'kind': 'P',
+                    'is_locked': False
+                })
+        return assignments
+
@@ -0,0 +1,154 @@
+"""Compiled CP-SAT models kept per dataset version in each worker process"""
+
+import atexit
+import io
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+from typing import Optional, Tuple
+
+from ortools.sat.python import cp_model
+
+from cache import LRUCache, content_hash
+from model import SolverInput, TimetableSolver, create_solver
+from options import resolve_options
+
+logger = logging.getLogger(__name__)
+
+# Options that change the model itself; the others only steer the search
+MODEL_OPTIONS = ('formulation', 'room_pools', 'symmetry_breaking', 'greedy_hint')
+
+_models = LRUCache(max_entries=int(os.getenv('COMPILED_MODELS', '4')),
+                   ttl=int(os.getenv('COMPILED_MODEL_TTL', '3600')))
+# Files of models this process built for its workers (see export_compiled)
+_exports = LRUCache(max_entries=int(os.getenv('COMPILED_MODELS', '4')),
+                    ttl=int(os.getenv('COMPILED_MODEL_TTL', '3600')))
+_export_dir: Optional[str] = None
+
+
+class _SolverPickler(pickle.Pickler):
+    """Pickles a built solver with its CP-SAT objects left out: the model is shipped
+    as a proto, and every variable referring to it as its proto index"""
+
+    def persistent_id(self, obj):
+        if isinstance(obj, cp_model.IntVar):
+            return 'var', obj.Index()
+        if isinstance(obj, cp_model.CpModel):
+            return 'model', None
+        if isinstance(obj, cp_model.CpSolver):
+            return 'solver', None
+        return None
+
+
+class _SolverUnpickler(pickle.Unpickler):
+    def __init__(self, data: bytes, model: cp_model.CpModel):
+        super().__init__(io.BytesIO(data))
+        self.model = model
+        self.variables = {}
+
+    def persistent_load(self, pid):
+        kind, index = pid
+        if kind == 'var':
+            # One object per variable, however many maps refer to it
+            if index not in self.variables:
+                self.variables[index] = self.model.GetIntVarFromProtoIndex(index)
+            return self.variables[index]
+        return self.model if kind == 'model' else None
+
+
+def dataset_key(input_data: SolverInput) -> str:
+    """Content hash of the input without its locks, blackouts and search parameters"""
+    data = input_data.model_dump(exclude={'locked_assignments', 'blackouts', 'solver_options'})
+    options = resolve_options(input_data.solver_options)
+    data['model_options'] = {key: options[key] for key in MODEL_OPTIONS}
+    return content_hash(data)
+
+
+def compiled_solver(input_data: SolverInput) -> TimetableSolver:
+    """The compiled solver kept for this dataset version, rebound to input_data.
+
+    The first call builds a model without locks or blackouts; every call
+    then re-solves it with those as assumptions, skipping construction.
+    Other formulations, compiled_models switched off, or a lock outside the
+    compiled domain fall back to a freshly built solver.
+    """
+    if not _compilable(input_data):
+        return create_solver(input_data)
+
+    key = dataset_key(input_data)
+    solver = _models.get(key)
+    if solver is None:
+        solver = TimetableSolver(input_data.model_copy(update={'locked_assignments': [], 'blackouts': []}))
+        solver.compiled = True
+        _models.set(key, solver)
+        logger.info(f"Compiling model for dataset {key[:12]}")
+    if not solver.rebind(input_data):
+        logger.info(f"Locks fall outside compiled model {key[:12]}; building a fresh model")
+        return create_solver(input_data)
+    return solver
+
+
+def _compilable(input_data: SolverInput) -> bool:
+    options = resolve_options(input_data.solver_options)
+    return options['compiled_models'] and options['formulation'] == 'rooms'
+
+
+def _export_path(key: str) -> str:
+    global _export_dir
+    if _export_dir is None:
+        _export_dir = tempfile.mkdtemp(prefix='compiled-models-')
+        atexit.register(shutil.rmtree, _export_dir, True)
+    return os.path.join(_export_dir, f"{key}.pkl")
+
+
+def export_compiled(input_data: SolverInput) -> Optional[Tuple[str, str, dict]]:
+    """Build the compiled model of input_data's dataset in this process and write
+    it to a file that workers load instead of building their own (see load_compiled).
+
+    The file holds the CpModelProto in text format, which CP-SAT parses far
+    faster than a binary proto converted through cp_model_pb2, and the solver
+    pickled with its variables as proto indices. Returns (dataset key, file,
+    build timings), the timings empty when an earlier call built it; None
+    when compiled_solver would not use a compiled model for this input.
+    """
+    if not _compilable(input_data):
+        return None
+    key = dataset_key(input_data)
+    path = _exports.get(key)
+    if path is not None and os.path.exists(path):
+        return key, path, {}
+
+    solver = TimetableSolver(input_data.model_copy(update={'locked_assignments': [], 'blackouts': []}))
+    solver.compiled = True
+    solver.build()
+    state = io.BytesIO()
+    _SolverPickler(state).dump(solver)
+    path = _export_path(key)
+    with open(path, 'wb') as f:
+        pickle.dump((str(solver.model.Proto()), state.getvalue()), f, protocol=pickle.HIGHEST_PROTOCOL)
+    _exports.set(key, path)
+    # Keep as many files as exports
+    files = sorted((os.path.join(_export_dir, name) for name in os.listdir(_export_dir)), key=os.path.getmtime)
+    for stale in files[:-_exports.max_entries]:
+        os.remove(stale)
+    logger.info(f"Exported compiled model for dataset {key[:12]} ({os.path.getsize(path)} bytes)")
+    return key, path, solver.timings
+
+
+def load_compiled(key: str, path: str) -> bool:
+    """Keep an exported model as this process's compiled model for its dataset,
+    unless one is kept already or the file is gone; returns whether it was loaded"""
+    if _models.get(key) is not None:
+        return False
+    try:
+        with open(path, 'rb') as f:
+            proto, state = pickle.load(f)
+    except FileNotFoundError:
+        logger.info(f"Exported model {key[:12]} was removed; building it here")
+        return False
+    model = cp_model.CpModel()
+    model.Proto().parse_text_format(proto)
+    _models.set(key, _SolverUnpickler(state, model).load())
+    return True
@@ -0,0 +1,131 @@
+"""Split a SolverInput into independent subproblems and merge their results"""
+
+import logging
+import math
+from typing import Dict, List, Set
+
+from model import SolverInput, SolverOutput
+from options import resolve_options
+
+logger = logging.getLogger(__name__)
+
+
+class _UnionFind:
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i: int, j: int):
+        root_i, root_j = self.find(i), self.find(j)
+        if root_i != root_j:
+            self.parent[root_j] = root_i
+
+
+def room_pool(offering: dict, rooms: List[dict]) -> Set[str]:
+    """Rooms an offering could be placed in: fitting classrooms, plus labs if it has practicals"""
+    course = offering['course']
+    expected_size = offering.get('expected_size', 60)
+    pool = set()
+    if course['L'] > 0 or course['T'] > 0:
+        pool |= {r['id'] for r in rooms if r['kind'] == 'CLASS' and r['capacity'] >= expected_size}
+    if course['P'] > 0:
+        pool |= {r['id'] for r in rooms if r['kind'] == 'LAB'}
+    return pool
+
+
+def _locked_rooms(input_data: SolverInput) -> Dict[str, Set[str]]:
+    """Rooms each offering is locked into, which may lie outside its room pool"""
+    rooms: Dict[str, Set[str]] = {}
+    for locked in input_data.locked_assignments:
+        if locked.get('room_id'):
+            rooms.setdefault(locked['offering_id'], set()).add(locked['room_id'])
+    return rooms
+
+
+def find_components(input_data: SolverInput) -> List[List[str]]:
+    """Groups of offering IDs that share no teacher, section or eligible room with
+    other groups, so each can be solved on its own without changing the result"""
+    offerings = input_data.offerings
+    components = _UnionFind(len(offerings))
+    first_user: Dict[tuple, int] = {}
+    locked_rooms = _locked_rooms(input_data)
+
+    for o, offering in enumerate(offerings):
+        keys = [('section', offering['section']['id'])]
+        if offering.get('teacher'):
+            keys.append(('teacher', offering['teacher']['id']))
+        rooms = room_pool(offering, input_data.rooms) | locked_rooms.get(offering['id'], set())
+        keys.extend(('room', room_id) for room_id in rooms)
+        for key in keys:
+            if key in first_user:
+                components.union(first_user[key], o)
+            else:
+                first_user[key] = o
+
+    groups: Dict[int, List[str]] = {}
+    for o, offering in enumerate(offerings):
+        groups.setdefault(components.find(o), []).append(offering['id'])
+    return sorted(groups.values(), key=len, reverse=True)
+
+
+def component_input(input_data: SolverInput, offering_ids: List[str]) -> SolverInput:
+    """The part of input_data that concerns only these offerings"""
+    ids = set(offering_ids)
+    offerings = [o for o in input_data.offerings if o['id'] in ids]
+    teacher_ids = {o['teacher']['id'] for o in offerings if o.get('teacher')}
+    locked_rooms = _locked_rooms(input_data)
+    room_ids = set()
+    for offering in offerings:
+        room_ids |= room_pool(offering, input_data.rooms) | locked_rooms.get(offering['id'], set())
+
+    return input_data.model_copy(update={
+        'teachers': [t for t in input_data.teachers if t['id'] in teacher_ids],
+        'rooms': [r for r in input_data.rooms if r['id'] in room_ids],
+        'offerings': offerings,
+        'availability': [a for a in input_data.availability if a['teacher_id'] in teacher_ids],
+        'locked_assignments': [a for a in input_data.locked_assignments if a['offering_id'] in ids],
+        'current_assignments': [a for a in input_data.current_assignments if a['offering_id'] in ids],
+    })
+
+
+def split_input(input_data: SolverInput) -> List[SolverInput]:
+    """Independent parts of input_data, or input_data alone when it has none or
+    asks for alternatives, which are timetables of the whole input"""
+    if resolve_options(input_data.solver_options)['alternatives']:
+        return [input_data]
+    components = find_components(input_data)
+    if len(components) <= 1:
+        return [input_data]
+    logger.info(f"Decomposed {len(input_data.offerings)} offerings into "
+                f"{len(components)} components: {[len(c) for c in components]}")
+    return [component_input(input_data, component) for component in components]
+
+
+def merge_outputs(outputs: List[dict]) -> dict:
+    """Combine per-component SolverOutput dicts into one"""
+    if len(outputs) == 1:
+        return outputs[0]
+
+    penalties: Dict[str, float] = {}
+    for output in outputs:
+        for key, value in output['penalties'].items():
+            if isinstance(value, (int, float)):
+                penalties[key] = penalties.get(key, 0) + value
+
+    objectives = [output['objective'] for output in outputs]
+    return SolverOutput(
+        assignments=[a for output in outputs for a in output['assignments']],
+        objective=sum(objectives) if all(math.isfinite(o) for o in objectives) else float('inf'),
+        penalties=penalties,
+        skipped=[s for output in outputs for s in output['skipped']],
+        stats={
+            'decomposition': {'components': len(outputs)},
+            'components': [output.get('stats', {}) for output in outputs],
+        },
+    ).model_dump()
+
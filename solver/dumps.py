@@ -0,0 +1,91 @@
+"""Opt-in dumps of solver inputs and built CP-SAT models, for replaying slow solves offline.
+
+Set SOLVER_DUMP_DIR to write one directory per solve, holding the
+SolverInput (input.json), the CpModelProto as solved, with its hints and
+assumptions (model.pb), and the parameters, timings and result (meta.json).
+SOLVER_DUMP_MIN_SECONDS keeps only solves at least that slow. replay.py
+reads the directories back.
+"""
+
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from google.protobuf import text_format
+from ortools.sat import cp_model_pb2
+from ortools.sat.python import cp_model
+
+from cache import content_hash
+
+logger = logging.getLogger(__name__)
+
+INPUT_FILE = 'input.json'
+MODEL_FILE = 'model.pb'
+META_FILE = 'meta.json'
+
+
+def dump_dir() -> Optional[str]:
+    return os.getenv('SOLVER_DUMP_DIR') or None
+
+
+def write_dump(solver, output, parameters) -> Optional[str]:
+    """Write a finished solve to SOLVER_DUMP_DIR; returns the dump directory, or None
+    when dumps are off, the solve was too fast, or writing failed"""
+    root = dump_dir()
+    total = output.stats.get('timings', {}).get('total', 0)
+    if root is None or total < float(os.getenv('SOLVER_DUMP_MIN_SECONDS', '0')):
+        return None
+
+    data = solver.input.model_dump()
+    # Input hash groups repeat solves; the suffix keeps them apart
+    directory = os.path.join(root, f"{time.strftime('%Y%m%d-%H%M%S')}-{content_hash(data)[:12]}-"
+                                   f"{uuid.uuid4().hex[:6]}")
+    meta = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'engine': type(solver).__name__,
+        'options': solver.options,
+        # Sessions decomposition or incremental re-solving pinned outside the input
+        'fixed_assignments': solver.fixed_assignments,
+        'parameters': str(parameters),  # SatParameters in text format
+        'objective': output.objective,
+        'timings': output.stats.get('timings'),
+        'search': output.stats.get('search'),
+        'model': output.stats.get('model'),
+        'compiled': output.stats.get('compiled'),
+    }
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, INPUT_FILE), 'w') as f:
+            json.dump(data, f, default=str)
+        if not solver.model.ExportToFile(os.path.join(directory, MODEL_FILE)):
+            raise OSError(f"CP-SAT could not write {MODEL_FILE}")
+        with open(os.path.join(directory, META_FILE), 'w') as f:
+            json.dump(meta, f, indent=2, default=str)
+    except OSError as e:
+        logger.warning(f"Could not write solver dump to {directory}: {e}")
+        return None
+    logger.info(f"Dumped solve ({total}s) to {directory}")
+    return directory
+
+
+def read_dump(directory: str) -> Tuple[Dict[str, Any], cp_model_pb2.CpModelProto, Dict[str, Any]]:
+    """(SolverInput dict, CpModelProto, meta) of a dump directory; the proto is the
+    protobuf message, which load_model turns back into a CpModel"""
+    with open(os.path.join(directory, INPUT_FILE)) as f:
+        data = json.load(f)
+    proto = cp_model_pb2.CpModelProto()
+    with open(os.path.join(directory, MODEL_FILE), 'rb') as f:
+        proto.ParseFromString(f.read())
+    with open(os.path.join(directory, META_FILE)) as f:
+        meta = json.load(f)
+    return data, proto, meta
+
+
+def load_model(proto: cp_model_pb2.CpModelProto) -> cp_model.CpModel:
+    """A CpModel holding a dumped proto (CpModel.Proto() only parses text format)"""
+    model = cp_model.CpModel()
+    model.Proto().parse_text_format(text_format.MessageToString(proto))
+    return model
@@ -0,0 +1,98 @@
+"""Engine-independent scoring of a timetable against TimetableSolver's soft objectives"""
+
+from collections import defaultdict
+from typing import Any, Dict, List
+
+DAYS = ['MON', 'TUE', 'WED', 'THU', 'FRI']
+
+
+def _teacher_id(offering: dict):
+    if offering.get('teacher'):
+        return offering['teacher']['id']
+    return offering.get('teacher_id')
+
+
+def _section_id(offering: dict):
+    if offering.get('section'):
+        return offering['section']['id']
+    return offering.get('section_id')
+
+
+def evaluate_penalties(data: Dict[str, Any], assignments: List[dict]) -> dict:
+    """Penalty breakdown and total for a list of assignments.
+
+    Uses the weights of TimetableSolver.add_soft_objectives (lectures and
+    tutorials only, as in the CP-SAT model) so that results from any engine
+    can be compared on one scale. Also counts hard-constraint violations:
+    double-booked teachers, sections and rooms.
+    """
+    offerings = {o['id']: o for o in data['offerings']}
+    teachers = {t['id']: t for t in data['teachers']}
+    slots = {s['id']: s for s in data['slots']}
+
+    penalties = {'teacher_prefs': 0, 'max_per_day': 0, 'max_per_week': 0, 'gaps': 0, 'spread': 0}
+    teacher_day = defaultdict(int)
+    teacher_week = defaultdict(int)
+    section_slots = defaultdict(set)
+    offering_day = defaultdict(int)
+    occupancy = defaultdict(int)
+
+    for assignment in assignments:
+        offering = offerings.get(assignment['offering_id'])
+        slot = slots.get(assignment['slot_id'])
+        if offering is None or slot is None:
+            continue
+        teacher_id = _teacher_id(offering)
+        section_id = _section_id(offering)
+
+        occupancy[('room', assignment['room_id'], slot['id'])] += 1
+        occupancy[('section', section_id, slot['id'])] += 1
+        if teacher_id:
+            occupancy[('teacher', teacher_id, slot['id'])] += 1
+
+        section_slots[(section_id, slot['day'])].add(slot['id'])
+        if assignment['kind'] == 'P':
+            continue
+
+        offering_day[(offering['id'], slot['day'])] += 1
+        if not teacher_id:
+            continue
+        teacher_day[(teacher_id, slot['day'])] += 1
+        teacher_week[teacher_id] += 1
+
+        prefs = (offering.get('teacher') or teachers.get(teacher_id, {})).get('prefs', {}) or {}
+        if prefs.get('avoid_8am') and slot['start_time'] == '08:00':
+            penalties['teacher_prefs'] += 5
+        if prefs.get('avoid_late') and slot['start_time'] >= '17:00':
+            penalties['teacher_prefs'] += 5
+        prefer_days = prefs.get('prefer_days', [])
+        if prefer_days and slot['day'] not in prefer_days:
+            penalties['teacher_prefs'] += 2
+
+    for (teacher_id, _), count in teacher_day.items():
+        max_per_day = teachers.get(teacher_id, {}).get('max_per_day', 3)
+        penalties['max_per_day'] += max(0, count - max_per_day) * 10
+    for teacher_id, count in teacher_week.items():
+        max_per_week = teachers.get(teacher_id, {}).get('max_per_week', 12)
+        penalties['max_per_week'] += max(0, count - max_per_week) * 20
+
+    # Gaps: idle periods between blocks of sessions (labs included) on one day
+    day_slots = {
+        day: sorted((s for s in data['slots'] if s['day'] == day), key=lambda s: s['start_time'])
+        for day in DAYS
+    }
+    for (section_id, day), occupied in section_slots.items():
+        busy = [s['id'] in occupied for s in day_slots.get(day, [])]
+        blocks = sum(1 for i, b in enumerate(busy) if b and (i == 0 or not busy[i - 1]))
+        penalties['gaps'] += max(0, blocks - 1) * 3
+
+    # Spread: lectures and tutorials of one offering beyond the first on a day
+    for count in offering_day.values():
+        penalties['spread'] += max(0, count - 1) * 4
+
+    violations = sum(count - 1 for count in occupancy.values() if count > 1)
+    return {
+        'penalties': penalties,
+        'total': sum(penalties.values()),
+        'hard_violations': violations,
+    }
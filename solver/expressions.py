@@ -0,0 +1,52 @@
+"""Flat linear expressions for CP-SAT, built without Python operator trees"""
+
+from typing import Iterable
+
+from ortools.sat.python import cp_model
+
+
+class LinearTerms:
+    """Coefficients accumulated per variable and emitted as one weighted sum.
+
+    Adding the same variable twice merges its coefficients, so an expression
+    never holds duplicate terms, and ``expr()`` makes a single call to
+    ``LinearExpr.weighted_sum`` instead of nesting one node per ``+``.
+    """
+
+    __slots__ = ('variables', 'coefficients', 'positions', 'constant')
+
+    def __init__(self):
+        self.variables = []
+        self.coefficients = []
+        self.positions = {}
+        self.constant = 0
+
+    def add(self, var: cp_model.IntVar, coeff: int = 1):
+        position = self.positions.get(var.index)
+        if position is None:
+            self.positions[var.index] = len(self.variables)
+            self.variables.append(var)
+            self.coefficients.append(coeff)
+        else:
+            self.coefficients[position] += coeff
+
+    def add_all(self, variables: Iterable[cp_model.IntVar], coeff: int = 1):
+        for var in variables:
+            self.add(var, coeff)
+
+    def add_constant(self, value: int):
+        self.constant += value
+
+    def extend(self, other: 'LinearTerms'):
+        for var, coeff in zip(other.variables, other.coefficients):
+            self.add(var, coeff)
+        self.constant += other.constant
+
+    def expr(self) -> cp_model.LinearExprT:
+        if not self.variables:
+            return self.constant
+        expr = cp_model.LinearExpr.weighted_sum(self.variables, self.coefficients)
+        return expr + self.constant if self.constant else expr
+
+    def __len__(self) -> int:
+        return len(self.variables)
@@ -0,0 +1,134 @@
+"""Large-neighbourhood reoptimization around changed teachers, sections and rooms"""
+
+import logging
+import math
+import time
+from collections import defaultdict
+from typing import Dict, List, Set
+
+from pydantic import BaseModel, Field
+
+from model import SolverInput, SolverOutput, create_solver
+
+logger = logging.getLogger(__name__)
+
+
+class NeighbourhoodChanges(BaseModel):
+    teacher_ids: List[str] = []
+    section_ids: List[str] = []
+    room_ids: List[str] = []
+    offering_ids: List[str] = []
+
+
+class IncrementalInput(SolverInput):
+    changes: NeighbourhoodChanges = NeighbourhoodChanges()
+    # Conflict-graph hops added around the directly affected offerings
+    radius: int = 1
+    time_budget: float = 10.0
+    max_rounds: int = Field(5, ge=1)
+
+
+class ConflictGraph:
+    """Offerings linked by a shared teacher, section or (currently used) room"""
+
+    def __init__(self, offerings: List[dict], assignments: List[dict]):
+        self.by_teacher: Dict[str, Set[str]] = defaultdict(set)
+        self.by_section: Dict[str, Set[str]] = defaultdict(set)
+        self.by_room: Dict[str, Set[str]] = defaultdict(set)
+        self.keys: Dict[str, Set[tuple]] = defaultdict(set)
+
+        for offering in offerings:
+            self._link(offering['id'], 'section', offering['section']['id'], self.by_section)
+            if offering.get('teacher'):
+                self._link(offering['id'], 'teacher', offering['teacher']['id'], self.by_teacher)
+        for assignment in assignments:
+            self._link(assignment['offering_id'], 'room', assignment['room_id'], self.by_room)
+
+    def _link(self, offering_id: str, kind: str, entity_id: str, index: Dict[str, Set[str]]):
+        index[entity_id].add(offering_id)
+        self.keys[offering_id].add((kind, entity_id))
+
+    def affected(self, changes: NeighbourhoodChanges) -> Set[str]:
+        """Offerings directly touched by the changed entities"""
+        affected = set(changes.offering_ids)
+        for teacher_id in changes.teacher_ids:
+            affected |= self.by_teacher.get(teacher_id, set())
+        for section_id in changes.section_ids:
+            affected |= self.by_section.get(section_id, set())
+        for room_id in changes.room_ids:
+            affected |= self.by_room.get(room_id, set())
+        return affected
+
+    def neighbourhood(self, seeds: Set[str], radius: int) -> Set[str]:
+        """Offerings within `radius` hops of the seeds"""
+        indexes = {'teacher': self.by_teacher, 'section': self.by_section, 'room': self.by_room}
+        hood = set(seeds)
+        frontier = set(seeds)
+        for _ in range(radius):
+            reached = set()
+            for offering_id in frontier:
+                for kind, entity_id in self.keys.get(offering_id, ()):
+                    reached |= indexes[kind][entity_id]
+            frontier = reached - hood
+            if not frontier:
+                break
+            hood |= frontier
+        return hood
+
+
+def solve_incremental(input_data: IncrementalInput) -> SolverOutput:
+    """Re-solve only the neighbourhood of the changes, widening it each round.
+
+    Offerings outside the neighbourhood keep their placement from the best
+    timetable so far. Each round adds one hop to the radius and runs until
+    the time budget or max_rounds is used up, or the neighbourhood stops
+    growing.
+    """
+    start = time.monotonic()
+    all_ids = {o['id'] for o in input_data.offerings}
+    best_assignments = list(input_data.current_assignments)
+    graph = ConflictGraph(input_data.offerings, best_assignments)
+    seeds = graph.affected(input_data.changes)
+
+    best = None
+    rounds = []
+    previous_size = -1
+    for round_no in range(input_data.max_rounds):
+        remaining = input_data.time_budget - (time.monotonic() - start)
+        if round_no > 0 and remaining <= 0:
+            break
+
+        hood = graph.neighbourhood(seeds, input_data.radius + round_no)
+        if len(hood) == previous_size:
+            break
+        previous_size = len(hood)
+
+        fixed = [a for a in best_assignments if a['offering_id'] not in hood and not a.get('is_locked')]
+        solver = create_solver(input_data, fixed_assignments=fixed)
+        solver.time_limit = max(remaining, 0.1)
+        output = solver.solve()
+
+        solved = math.isfinite(output.objective)
+        rounds.append({
+            'neighbourhood': len(hood),
+            'unfixed': len(solver.unfixed_offerings),
+            'objective': output.objective if solved else None,
+            'elapsed': round(time.monotonic() - start, 3),
+        })
+        logger.info(f"Incremental round {round_no + 1}: {len(hood)}/{len(all_ids)} offerings free, "
+                    f"objective {output.objective}")
+
+        if solved and (best is None or output.objective < best.objective):
+            best = output
+            best_assignments = output.assignments
+        if len(hood) >= len(all_ids):
+            break
+
+    result = best or output
+    result.stats['incremental'] = {'affected': len(seeds), 'rounds': rounds}
+    return result
+
+
+def run_incremental(payload: dict, stop_event=None) -> dict:
+    """Worker-process entry point for solve_incremental"""
+    return solve_incremental(IncrementalInput(**payload)).model_dump()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""Synthetic timetable instances extrapolated from the seed/*.csv schema"""
+
+import argparse
+import json
+import random
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List
+
+DAYS = ['MON', 'TUE', 'WED', 'THU', 'FRI']
+PERIODS = [('08:00', '08:55'), ('09:00', '09:55'), ('10:00', '10:55'), ('11:00', '11:55'),
+           ('14:00', '14:55'), ('15:00', '15:55'), ('16:00', '16:55'), ('17:00', '17:55')]
+# Lab clusters take three consecutive periods: afternoons first, as in the seed slot matrix
+LAB_BLOCKS = [(day, 4) for day in ['WED', 'THU', 'MON', 'TUE', 'FRI']] + \
+             [(day, 0) for day in ['WED', 'THU', 'MON', 'TUE', 'FRI']]
+# (L, T, P) patterns seen in seed/courses.csv, with about 30% of courses having labs
+COURSE_PATTERNS = [(3, 1, 0), (3, 0, 2), (3, 1, 2), (3, 0, 0), (2, 1, 0)]
+PATTERN_WEIGHTS = [3, 1.5, 1.5, 2, 2]
+NEEDS = ['Projector', 'PC', 'Equipment', 'Board', 'AC']
+PROGRAMS = ['BTech', 'MTech', 'MSc']
+DEPARTMENTS = ['AE', 'CE', 'CS', 'EE', 'ME', 'CH', 'MA', 'PH']
+
+
+@dataclass
+class InstanceSpec:
+    teachers: int
+    sections: int
+    offerings: int
+    class_rooms: int
+    lab_rooms: int
+    lab_clusters: int = 2
+    availability: float = 0.7
+    seed: int = 0
+
+
+SIZES = {
+    'seed': InstanceSpec(teachers=3, sections=4, offerings=7, class_rooms=3, lab_rooms=2),
+    'small': InstanceSpec(teachers=20, sections=8, offerings=40, class_rooms=10, lab_rooms=6, lab_clusters=3),
+    'medium': InstanceSpec(teachers=100, sections=50, offerings=250, class_rooms=60, lab_rooms=20, lab_clusters=5),
+    'large': InstanceSpec(teachers=300, sections=200, offerings=1000, class_rooms=220, lab_rooms=70, lab_clusters=6),
+    'institute': InstanceSpec(teachers=1000, sections=600, offerings=3000, class_rooms=650, lab_rooms=200,
+                              lab_clusters=6),
+}
+
+
+def _slots(lab_clusters: int) -> List[Dict[str, Any]]:
+    lab_periods = {}
+    for c, (day, first) in enumerate(LAB_BLOCKS[:lab_clusters]):
+        for offset in range(3):
+            lab_periods[(day, first + offset)] = (f"LAB_{chr(ord('J') + c)}", offset + 1)
+
+    slots = []
+    for d, day in enumerate(DAYS):
+        for p, (start, end) in enumerate(PERIODS):
+            cluster = lab_periods.get((day, p))
+            slots.append({
+                'id': f"slot-{day}-{start.replace(':', '')}",
+                'code': cluster[0][-1] if cluster else chr(ord('A') + p),
+                'occ': cluster[1] if cluster else d + 1,
+                'day': day,
+                'start_time': start,
+                'end_time': end,
+                'cluster': cluster[0] if cluster else None,
+                'is_lab': cluster is not None,
+            })
+    return slots
+
+
+def generate_instance(spec: InstanceSpec) -> Dict[str, Any]:
+    """A SolverInput-shaped dict usable by all three engines"""
+    rng = random.Random(spec.seed)
+
+    teachers = []
+    for i in range(spec.teachers):
+        prefs = {}
+        if rng.random() < 0.3:
+            prefs['avoid_8am'] = True
+        if rng.random() < 0.2:
+            prefs['avoid_late'] = True
+        if rng.random() < 0.25:
+            prefs['prefer_days'] = sorted(rng.sample(DAYS, 3), key=DAYS.index)
+        teachers.append({
+            'id': f"t{i:04d}", 'code': f"T{i + 1:03d}", 'name': f"Teacher {i + 1}",
+            'max_per_day': rng.choice([3, 3, 4]), 'max_per_week': rng.choice([12, 12, 15]), 'prefs': prefs,
+        })
+
+    rooms = []
+    for i in range(spec.class_rooms):
+        rooms.append({'id': f"r{i:04d}", 'code': f"NC{100 + i}", 'capacity': rng.choice([40, 60, 60, 80, 120]),
+                      'kind': 'CLASS', 'tags': rng.sample(NEEDS, 2)})
+    for i in range(spec.lab_rooms):
+        rooms.append({'id': f"l{i:04d}", 'code': f"LAB{100 + i}", 'capacity': rng.choice([25, 30, 40, 60]),
+                      'kind': 'LAB', 'tags': rng.sample(NEEDS, 2)})
+    max_class_capacity = max((r['capacity'] for r in rooms if r['kind'] == 'CLASS'), default=60)
+
+    slots = _slots(spec.lab_clusters)
+    availability = [
+        {'teacher_id': t['id'], 'slot_id': s['id'], 'can_teach': rng.random() < spec.availability}
+        for t in teachers for s in slots
+    ]
+
+    courses = []
+    for i in range(max(1, spec.offerings // 3)):
+        L, T, P = rng.choices(COURSE_PATTERNS, PATTERN_WEIGHTS)[0]
+        dept = rng.choice(DEPARTMENTS)
+        courses.append({'id': f"c{i:04d}", 'code': f"{dept}{101 + i}", 'name': f"{dept} Course {i + 1}",
+                        'L': L, 'T': T, 'P': P})
+
+    sections = []
+    for i in range(spec.sections):
+        dept = DEPARTMENTS[i % len(DEPARTMENTS)]
+        year = i // len(DEPARTMENTS) % 4 + 1
+        sections.append({'id': f"s{i:04d}", 'program': rng.choice(PROGRAMS), 'year': year,
+                         'name': f"{dept}-{year}Y-{i // (4 * len(DEPARTMENTS)) + 1}"})
+
+    # A section or teacher can have at most one lab per cluster
+    lab_budget = max(spec.lab_clusters, 1)
+    section_courses = {s['id']: set() for s in sections}
+    section_labs = {s['id']: 0 for s in sections}
+    teacher_labs = {t['id']: 0 for t in teachers}
+    # Teachers take offerings least-loaded first, within their weekly limit and available slots
+    load = {t['id']: 0 for t in teachers}
+    theory_load = {t['id']: 0 for t in teachers}
+    theory_slots = {s['id'] for s in slots if not s['is_lab']}
+    free_slots = {t['id']: 0 for t in teachers}
+    for avail in availability:
+        if avail['can_teach'] and avail['slot_id'] in theory_slots:
+            free_slots[avail['teacher_id']] += 1
+    capacity = {t['id']: min(t['max_per_week'], free_slots[t['id']]) for t in teachers}
+
+    offerings = []
+    for i in range(spec.offerings):
+        section = sections[i % len(sections)]
+        candidates = [c for c in courses if c['id'] not in section_courses[section['id']]]
+        if section_labs[section['id']] >= lab_budget:
+            candidates = [c for c in candidates if c['P'] == 0]
+        course = rng.choice(candidates or courses)
+
+        pool = rng.sample(teachers, min(5, len(teachers)))
+        if course['P'] > 0:
+            pool = [t for t in pool if teacher_labs[t['id']] < lab_budget] or pool
+        theory = course['L'] + course['T']
+        pool = [t for t in pool if theory_load[t['id']] + theory <= capacity[t['id']]] or \
+            [t for t in teachers if theory_load[t['id']] + theory <= capacity[t['id']]] or pool
+        teacher = min(pool, key=lambda t: load[t['id']])
+
+        load[teacher['id']] += course['L'] + course['T'] + course['P']
+        theory_load[teacher['id']] += theory
+        section_courses[section['id']].add(course['id'])
+        if course['P'] > 0:
+            section_labs[section['id']] += 1
+            teacher_labs[teacher['id']] += 1
+
+        size_band = rng.choices([(30, 60), (60, 80), (80, 110)], [70, 25, 5])[0]
+        offerings.append({
+            'id': f"o{i:05d}", 'course_id': course['id'], 'section_id': section['id'], 'teacher_id': teacher['id'],
+            'expected_size': min(rng.randint(*size_band), max_class_capacity),
+            'needs': rng.sample(NEEDS, rng.randint(0, 2)),
+            'course': course, 'section': section, 'teacher': teacher,
+        })
+
+    return {
+        'teachers': teachers, 'rooms': rooms, 'slots': slots, 'offerings': offerings,
+        'availability': availability, 'locked_assignments': [],
+        'meta': {'generator': asdict(spec)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', choices=sorted(SIZES), default='small')
+    parser.add_argument('--teachers', type=int)
+    parser.add_argument('--sections', type=int)
+    parser.add_argument('--offerings', type=int)
+    parser.add_argument('--class-rooms', type=int)
+    parser.add_argument('--lab-rooms', type=int)
+    parser.add_argument('--lab-clusters', type=int)
+    parser.add_argument('--availability', type=float, help='Probability a teacher can teach a given slot')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', '-o', help='Write JSON here instead of stdout')
+    args = parser.parse_args()
+
+    spec = asdict(SIZES[args.size])
+    for key in spec:
+        value = getattr(args, key, None)
+        if value is not None:
+            spec[key] = value
+    instance = generate_instance(InstanceSpec(**spec))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(instance, f)
+    else:
+        print(json.dumps(instance))
+
+
+if __name__ == '__main__':
+    main()
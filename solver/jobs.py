@@ -0,0 +1,398 @@
+"""Background solve jobs running in a process pool"""
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from model import SolverInput, SolverOutput
+from compiled import compiled_solver, export_compiled, load_compiled
+from metrics import record_stats
+from options import pool_size, shared_workers
+from portfolio import HEURISTICS, rank, run_heuristic, score
+
+logger = logging.getLogger(__name__)
+
+JOB_TTL = int(os.getenv('JOB_TTL', '86400'))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (COMPLETED, FAILED, CANCELLED)
+
+# Seconds a portfolio waits past its deadline for CP-SAT to return its best solution
+STOP_GRACE = 5.0
+
+
+def run_solver(payload: dict, stop_event=None, events=None) -> dict:
+    """Solve one SolverInput payload; runs inside a worker process.
+
+    When stop_event is set while CP-SAT is searching, the search is stopped
+    and the best timetable found so far is returned. When an events queue is
+    given, every improving solution is put on it as it is found.
+    """
+    solver = compiled_solver(SolverInput(**payload))
+    done = threading.Event()
+
+    def watch():
+        while not done.is_set():
+            if stop_event.is_set():
+                solver.stop()
+            done.wait(0.1)
+
+    if stop_event is not None:
+        threading.Thread(target=watch, daemon=True).start()
+    try:
+        return solver.solve(on_solution=events.put if events is not None else None).model_dump()
+    finally:
+        done.set()
+
+
+def run_compiled(payload: dict, key: str, path: str) -> dict:
+    """run_solver on an exported compiled model (see compiled.export_compiled),
+    which this worker loads unless it keeps one for the dataset already"""
+    load_compiled(key, path)
+    return run_solver(payload)
+
+
+def _job_result(result: dict) -> dict:
+    """SolverOutput as plain JSON, with an infinite objective stored as null"""
+    return json.loads(SolverOutput(**result).model_dump_json())
+
+
+class MemoryJobStore:
+    """Job records kept in this process; like Redis, a record expires ttl seconds
+    after it was last written"""
+
+    def __init__(self, ttl: int = JOB_TTL):
+        self.ttl = ttl
+        self._jobs: Dict[str, Tuple[float, dict]] = {}
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        now = time.monotonic()
+        for job_id in [job_id for job_id, (expires_at, _) in self._jobs.items() if expires_at < now]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            self._expire()
+            entry = self._jobs.get(job_id)
+            return dict(entry[1]) if entry else None
+
+    def put(self, job: dict):
+        with self._lock:
+            self._expire()
+            self._jobs[job['id']] = (time.monotonic() + self.ttl, dict(job))
+
+    def update(self, job_id: str, **fields) -> Optional[dict]:
+        with self._lock:
+            self._expire()
+            entry = self._jobs.get(job_id)
+            if entry is None:
+                return None
+            job = entry[1]
+            job.update(fields)
+            self._jobs[job_id] = (time.monotonic() + self.ttl, job)
+            return dict(job)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._expire()
+            return len(self._jobs)
+
+
+class RedisJobStore:
+    """Job records kept in Redis, shared by every API worker"""
+
+    def __init__(self, client, ttl: int = JOB_TTL):
+        self.client = client
+        self.ttl = ttl
+
+    def _key(self, job_id: str) -> str:
+        return f"solver:job:{job_id}"
+
+    def get(self, job_id: str) -> Optional[dict]:
+        raw = self.client.get(self._key(job_id))
+        return json.loads(raw) if raw else None
+
+    def put(self, job: dict):
+        self.client.setex(self._key(job['id']), self.ttl, json.dumps(job, default=str))
+
+    def update(self, job_id: str, **fields) -> Optional[dict]:
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.update(fields)
+        self.put(job)
+        return job
+
+
+class JobManager:
+    """Submits solves to a process pool and tracks them in a job store"""
+
+    def __init__(self, store, max_workers: Optional[int] = None):
+        self.store = store
+        self.max_workers = max_workers or pool_size()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+        self._futures: Dict[str, Future] = {}
+        self._stop_events: Dict[str, object] = {}
+        self._active = 0
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    @property
+    def manager(self):
+        if self._manager is None:
+            self._manager = multiprocessing.Manager()
+        return self._manager
+
+    def _new_stop_event(self):
+        return self.manager.Event()
+
+    def _submit_solve(self, worker, payload: dict, *args) -> Future:
+        """Submit a CP-SAT solve with its share of the cores: all of them when it runs
+        alone, fewer as more solves run with it, unless num_workers is configured"""
+        with self._lock:
+            self._active += 1
+            active = self._active
+        options = payload.get('solver_options') or {}
+        if options.get('num_workers') is None and not os.getenv('SOLVER_NUM_WORKERS'):
+            payload = dict(payload, solver_options=dict(options, num_workers=shared_workers(active, self.max_workers)))
+        future = self.executor.submit(worker, payload, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future: Future):
+        with self._lock:
+            self._active -= 1
+
+    def submit(self, input_data: SolverInput, kind: str = 'solve') -> dict:
+        """Queue a solve and return its job record without waiting"""
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'kind': kind,
+            'status': QUEUED,
+            'created_at': time.time(),
+            'finished_at': None,
+            'result': None,
+            'error': None,
+        }
+        self.store.put(job)
+
+        stop_event = self._new_stop_event()
+        future = self._submit_solve(run_solver, input_data.model_dump(), stop_event)
+        self._futures[job_id] = future
+        self._stop_events[job_id] = stop_event
+        future.add_done_callback(lambda f: self._finish(job_id, f))
+        logger.info(f"Queued {kind} job {job_id} with {len(input_data.offerings)} offerings")
+        return job
+
+    def _finish(self, job_id: str, future: Future):
+        self._futures.pop(job_id, None)
+        self._stop_events.pop(job_id, None)
+
+        job = self.store.get(job_id)
+        if job is None or future.cancelled():
+            return
+        if job['status'] == CANCELLED:
+            # A stopped search still returns its best timetable so far
+            if future.exception() is None:
+                self.store.update(job_id, result=_job_result(future.result()))
+            return
+        error = future.exception()
+        if error is not None:
+            logger.error(f"Job {job_id} failed: {error}")
+            self.store.update(job_id, status=FAILED, error=str(error), finished_at=time.time())
+        else:
+            record_stats(future.result().get('stats', {}))
+            self.store.update(job_id, status=COMPLETED, result=_job_result(future.result()), finished_at=time.time())
+
+    def get(self, job_id: str) -> Optional[dict]:
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        future = self._futures.get(job_id)
+        if job['status'] == QUEUED and future is not None and future.running():
+            job = self.store.update(job_id, status=RUNNING) or job
+        return job
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """Cancel a queued job, or stop a running one at its current best solution.
+
+        Jobs submitted by another API worker are only marked cancelled here;
+        their search runs to its time limit before the result is stored.
+        """
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        if job['status'] in FINISHED:
+            return job
+
+        future = self._futures.get(job_id)
+        stop_event = self._stop_events.get(job_id)
+        if future is not None and not future.cancel() and stop_event is not None:
+            stop_event.set()
+        return self.store.update(job_id, status=CANCELLED, finished_at=time.time())
+
+    async def run(self, input_data: SolverInput, worker=run_solver) -> dict:
+        """Solve in the pool and await the result without blocking the event loop"""
+        future = self._submit_solve(worker, input_data.model_dump())
+        result = await asyncio.wrap_future(future)
+        record_stats(result.get('stats', {}))
+        return result
+
+    async def scenarios(self, base: SolverInput, variants: List[SolverInput]) -> Tuple[dict, List[dict]]:
+        """Solve a base input and variants of it in parallel; returns (base, variant) outputs.
+
+        The base model is built once, here, and shipped to the workers as a
+        proto with its variable indices (see compiled.py); each applies its
+        variant's locks, blackouts and teacher blackouts as assumptions.
+        Variants that change the model itself, e.g. its formulation, are
+        built by their worker.
+        """
+        exported = await asyncio.to_thread(export_compiled, base)
+        payloads = [input_data.model_dump() for input_data in [base] + variants]
+        if exported is None:
+            futures = [self._submit_solve(run_solver, payload) for payload in payloads]
+        else:
+            key, path, build_timings = exported
+            futures = [self._submit_solve(run_compiled, payload, key, path) for payload in payloads]
+        results = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+        for result in results:
+            record_stats(result.get('stats', {}))
+        if exported is not None and build_timings:
+            # The base solve accounts for the build
+            stats = results[0].setdefault('stats', {})
+            stats.setdefault('compiled', {})['reused'] = False
+            timings = dict(build_timings, **{phase: seconds for phase, seconds in stats.get('timings', {}).items()
+                                             if phase != 'total'})
+            stats['timings'] = dict(timings, total=round(sum(timings.values()), 4))
+        return results[0], list(results[1:])
+
+    async def stream(self, input_data: SolverInput) -> AsyncIterator[Tuple[str, dict]]:
+        """Yield ('solution', update) for each improving solution, then ('result', output).
+
+        Leaving the iterator early (e.g. the client disconnects) stops the search.
+        """
+        events = self.manager.Queue()
+        stop_event = self._new_stop_event()
+        future = self._submit_solve(run_solver, input_data.model_dump(), stop_event, events)
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    update = await loop.run_in_executor(None, events.get, True, 0.5)
+                    yield 'solution', update
+                except queue.Empty:
+                    if future.done():
+                        break
+            # Drain solutions reported just before the worker finished
+            while not events.empty():
+                yield 'solution', events.get_nowait()
+            error = future.exception()
+            if error is not None:
+                yield 'error', {'detail': str(error)}
+            else:
+                record_stats(future.result().get('stats', {}))
+                yield 'result', _job_result(future.result())
+        finally:
+            stop_event.set()
+
+    async def portfolio(self, input_data: SolverInput, deadline: float) -> dict:
+        """Race CP-SAT against the heuristic engines and return the best-scored timetable.
+
+        Returns at the deadline, or earlier once CP-SAT proves optimality or
+        every engine has finished. CP-SAT is then stopped at its best solution
+        so far, and engines still queued are cancelled. Each candidate's
+        score is reported in stats['portfolio'].
+        """
+        start = time.monotonic()
+        payload = input_data.model_dump()
+        cp_payload = dict(payload, solver_options=dict(payload['solver_options'], time_limit=deadline))
+
+        # Heuristics first: they take well under a second, even queued ahead of CP-SAT
+        futures = {engine: self.executor.submit(run_heuristic, engine, payload) for engine in HEURISTICS}
+        stop_event = self._new_stop_event()
+        futures['cp-sat'] = self._submit_solve(run_solver, cp_payload, stop_event)
+        tasks = {asyncio.wrap_future(future): engine for engine, future in futures.items()}
+
+        results, finished_at = {}, {}
+
+        def collect(done):
+            for task in done:
+                engine = tasks[task]
+                finished_at[engine] = round(time.monotonic() - start, 3)
+                if task.exception() is not None:
+                    logger.warning(f"Portfolio engine {engine} failed: {task.exception()}")
+                else:
+                    results[engine] = task.result()
+
+        try:
+            pending = set(tasks)
+            while pending:
+                remaining = deadline - (time.monotonic() - start)
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                collect(done)
+                status = results.get('cp-sat', {}).get('stats', {}).get('search', {}).get('status')
+                if status == 'OPTIMAL':
+                    break
+            if 'cp-sat' not in results and not futures['cp-sat'].cancel():
+                stop_event.set()
+                cp_task = next(task for task, engine in tasks.items() if engine == 'cp-sat')
+                done, _ = await asyncio.wait({cp_task}, timeout=STOP_GRACE)
+                collect(done)
+        finally:
+            stop_event.set()
+            cancelled = [engine for engine, future in futures.items()
+                         if engine not in finished_at and future.cancel()]
+
+        if not results:
+            raise RuntimeError(f"No engine returned a timetable within {deadline}s")
+        if 'cp-sat' in results:
+            record_stats(results['cp-sat'].get('stats', {}))
+
+        candidates = {}
+        for engine, output in results.items():
+            candidates[engine] = dict(score(payload, output), finished_at=finished_at[engine])
+            if engine == 'cp-sat':
+                candidates[engine]['status'] = output['stats'].get('search', {}).get('status')
+        winner = min(candidates, key=lambda engine: rank(candidates[engine]))
+        output = dict(results[winner])
+        output['stats'] = dict(output.get('stats') or {}, portfolio={
+            'winner': winner,
+            'deadline': deadline,
+            'elapsed': round(time.monotonic() - start, 3),
+            'candidates': candidates,
+            'cancelled': cancelled,
+            'unfinished': [engine for engine in futures if engine not in finished_at and engine not in cancelled],
+        })
+        logger.info(f"Portfolio won by {winner} with {candidates[winner]}")
+        return output
+
+    def shutdown(self):
+        for event in self._stop_events.values():
+            event.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._manager is not None:
+            self._manager.shutdown()
@@ -1,12 +1,22 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
+import asyncio
+from contextlib import aclosing
 import logging
 import os
 import json
-import hashlib
-from model import TimetableSolver, SolverInput, SolverOutput
+from model import SolverInput, SolverOutput
+from options import default_preset, resolve_options
+from jobs import JobManager, MemoryJobStore, RedisJobStore
+from cache import LRUCache, content_hash
+from incremental import IncrementalInput, run_incremental
+from decomposition import split_input, merge_outputs
+from scenarios import ScenarioInput, compare, scenario_input
+from screening import screen
+import metrics
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,39 +32,96 @@ if REDIS_URL:
         redis_client.ping()
         logger.info("Connected to Redis successfully")
     except Exception as e:
-        logger.warning(f"Redis connection failed: {e}. Caching disabled.")
+        logger.warning(f"Redis connection failed: {e}. Using in-process cache.")
         redis_client = None
 
+job_manager = JobManager(RedisJobStore(redis_client) if redis_client else MemoryJobStore())
+# Report a mistyped SOLVER_PRESET at startup rather than on the first solve
+default_preset()
+
+CACHE_TTL = int(os.getenv('CACHE_TTL', '3600'))
+memory_cache = LRUCache(max_entries=int(os.getenv('CACHE_MAX_ENTRIES', '128')), ttl=CACHE_TTL)
+cache_stats = {'hits': 0, 'misses': 0}
+
 def get_cache_key(data: dict) -> str:
-    """Generate a hash key from input data for caching"""
-    serialized = json.dumps(data, sort_keys=True, default=str)
-    return f"solver:{hashlib.md5(serialized.encode()).hexdigest()}"
+    """Generate a hash key from input data for caching; entity order does not change it"""
+    return f"solver:{content_hash(data)}"
 
 def get_cached_result(key: str) -> Optional[dict]:
-    """Get cached result from Redis"""
-    if not redis_client:
+    """Get cached result from Redis, or from the in-process LRU when Redis is unavailable"""
+    cached = None
+    if redis_client:
+        try:
+            raw = redis_client.get(key)
+            cached = json.loads(raw) if raw else None
+        except Exception as e:
+            logger.warning(f"Redis get error: {e}")
+            cached = memory_cache.get(key)
+    else:
+        cached = memory_cache.get(key)
+    
+    if cached is None:
+        cache_stats['misses'] += 1
         return None
-    try:
-        cached = redis_client.get(key)
-        if cached:
-            logger.info(f"Cache hit for key: {key[:20]}...")
-            return json.loads(cached)
-    except Exception as e:
-        logger.warning(f"Redis get error: {e}")
-    return None
+    cache_stats['hits'] += 1
+    logger.info(f"Cache hit for key: {key[:20]}...")
+    return cached
 
-def set_cached_result(key: str, result: dict, ttl: int = 3600):
-    """Cache result in Redis with TTL (default 1 hour)"""
-    if not redis_client:
-        return
-    try:
-        redis_client.setex(key, ttl, json.dumps(result, default=str))
-        logger.info(f"Cached result for key: {key[:20]}...")
-    except Exception as e:
-        logger.warning(f"Redis set error: {e}")
+def set_cached_result(key: str, result: dict, ttl: int = CACHE_TTL):
+    """Cache result in Redis with TTL (default 1 hour), falling back to the in-process LRU"""
+    if redis_client:
+        try:
+            redis_client.setex(key, ttl, json.dumps(result, default=str))
+            logger.info(f"Cached result for key: {key[:20]}...")
+            return
+        except Exception as e:
+            logger.warning(f"Redis set error: {e}")
+    memory_cache.set(key, result, ttl)
+
+def is_complete(result: dict) -> bool:
+    """A timetable found by the search that places every session"""
+    status = result.get('stats', {}).get('search', {}).get('status')
+    return status in ('OPTIMAL', 'FEASIBLE') and not result['skipped']
+
+async def solve_decomposed(input_data: SolverInput) -> dict:
+    """Solve each independent component as its own pool task and merge the results.
+    When any part finds no complete timetable the whole input is solved at once, so
+    a part's failure is diagnosed with the full model."""
+    parts = split_input(input_data)
+    if len(parts) == 1:
+        return await job_manager.run(input_data)
+    outputs = list(await asyncio.gather(*(job_manager.run(part) for part in parts)))
+    if not all(is_complete(output) for output in outputs):
+        logger.info(f"{sum(not is_complete(o) for o in outputs)} of {len(parts)} components "
+                    f"found no complete timetable; solving the whole input")
+        return await job_manager.run(input_data)
+    return merge_outputs(outputs)
+
+def is_cacheable(result: dict) -> bool:
+    """Only timetables the search found: an UNKNOWN, INFEASIBLE or rejected solve
+    may succeed when retried, e.g. with a longer time limit"""
+    stats = result.get('stats', {})
+    searches = [component.get('search', {}) for component in stats.get('components', [stats])]
+    return bool(searches) and all(search.get('status') in ('OPTIMAL', 'FEASIBLE') for search in searches)
+
+async def solve_cached(input_data: SolverInput) -> dict:
+    """Return the cached result for this input, or solve it in the worker pool and cache it"""
+    key = get_cache_key(input_data.model_dump())
+    result = get_cached_result(key)
+    if result is None:
+        result = await solve_decomposed(input_data)
+        if is_cacheable(result):
+            set_cached_result(key, result)
+        else:
+            logger.info(f"Not caching result for key {key[:20]}...: no timetable found")
+    return result
 
 app = FastAPI(title="Timetable Solver API")
 
+@app.on_event("shutdown")
+def shutdown_workers():
+    job_manager.shutdown()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -83,32 +150,133 @@ class RecommendationResponse(BaseModel):
 @app.get("/health")
 async def health_check():
     redis_status = "connected" if redis_client else "disabled"
-    return {"status": "healthy", "solver": "or-tools", "redis": redis_status}
+    cache = {
+        "backend": "redis" if redis_client else "memory",
+        "hits": cache_stats['hits'],
+        "misses": cache_stats['misses'],
+        "memory_entries": len(memory_cache),
+    }
+    return {"status": "healthy", "solver": "or-tools", "redis": redis_status, "cache": cache}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
 
 @app.post("/solve", response_model=SolverOutput)
-async def solve_timetable(input_data: SolverInput):
+async def solve_timetable(input_data: SolverInput, mode: str = "cp-sat",
+                          deadline: Optional[float] = Query(None, gt=0)):
+    """CP-SAT by default. mode=portfolio races CP-SAT, the greedy and the simple
+    engine and returns the best-scored timetable by the deadline (seconds,
+    defaulting to the time limit), or as soon as CP-SAT proves optimality."""
+    if mode not in ("cp-sat", "portfolio"):
+        raise HTTPException(status_code=400, detail=f"Unknown solve mode: {mode}")
     try:
-        logger.info(f"Solving timetable with {len(input_data.offerings)} offerings")
-        solver = TimetableSolver(input_data)
-        result = solver.solve()
-        logger.info(f"Solver completed with {len(result.assignments)} assignments")
+        logger.info(f"Solving timetable with {len(input_data.offerings)} offerings ({mode})")
+        if mode == "portfolio":
+            deadline = deadline or resolve_options(input_data.solver_options)['time_limit']
+            result = await job_manager.portfolio(input_data, deadline)
+        else:
+            result = await solve_cached(input_data)
+        logger.info(f"Solver completed with {len(result['assignments'])} assignments")
         return result
     except Exception as e:
         logger.error(f"Solver error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/screen")
+async def screen_timetable(input_data: SolverInput):
+    """Counting checks only: errors that make the input infeasible, and warnings"""
+    try:
+        return screen(input_data)
+    except Exception as e:
+        logger.error(f"Screening error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/solve/stream")
+async def solve_stream(input_data: SolverInput, request: Request):
+    """Server-Sent Events: one `solution` event per improving timetable, then `result`.
+    
+    Each solution carries objective, bound, elapsed seconds and the assignments
+    added/removed since the previous event. Closing the connection stops the search.
+    """
+    logger.info(f"Streaming solve with {len(input_data.offerings)} offerings")
+    
+    async def events():
+        async with aclosing(job_manager.stream(input_data)) as updates:
+            async for event, data in updates:
+                if await request.is_disconnected():
+                    logger.info("Stream client disconnected, stopping search")
+                    break
+                yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.post("/reoptimize", response_model=SolverOutput)
 async def reoptimize_timetable(input_data: SolverInput):
     try:
         logger.info(f"Re-optimizing with {len(input_data.locked_assignments)} locked assignments")
-        solver = TimetableSolver(input_data)
-        result = solver.solve()
-        logger.info(f"Re-optimization completed with {len(result.assignments)} assignments")
+        result = await solve_cached(input_data)
+        logger.info(f"Re-optimization completed with {len(result['assignments'])} assignments")
         return result
     except Exception as e:
         logger.error(f"Re-optimization error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/reoptimize/incremental", response_model=SolverOutput)
+async def reoptimize_incremental(input_data: IncrementalInput):
+    """Re-solve only the offerings around the changed teachers, sections and rooms"""
+    try:
+        logger.info(f"Incremental re-optimization around {input_data.changes.model_dump()}")
+        result = await job_manager.run(input_data, worker=run_incremental)
+        logger.info(f"Incremental re-optimization completed with {len(result['assignments'])} assignments")
+        return result
+    except Exception as e:
+        logger.error(f"Incremental re-optimization error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/scenarios")
+async def solve_scenarios(input_data: ScenarioInput):
+    """Solve a base timetable and what-if variants of it (extra blackouts, locks or
+    solver options) in the worker pool, and compare each variant's objective,
+    skipped sessions and changed assignments with the base"""
+    names = [scenario.name for scenario in input_data.scenarios]
+    if len(set(names)) != len(names):
+        raise HTTPException(status_code=400, detail="Scenario names must be unique")
+    try:
+        logger.info(f"Solving {len(names)} scenarios on {len(input_data.base.offerings)} offerings")
+        variants = [scenario_input(input_data.base, scenario) for scenario in input_data.scenarios]
+        base, outputs = await job_manager.scenarios(input_data.base, variants)
+        result = compare(input_data.scenarios, base, outputs)
+        logger.info(f"Scenarios completed with {result['stats']['model_builds']} model builds")
+        return result
+    except Exception as e:
+        logger.error(f"Scenario error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/jobs", status_code=202)
+async def create_job(input_data: SolverInput, kind: str = "solve"):
+    """Queue a solve in the worker pool and return its job id immediately"""
+    if kind not in ("solve", "reoptimize"):
+        raise HTTPException(status_code=400, detail=f"Unknown job kind: {kind}")
+    job = job_manager.submit(input_data, kind)
+    return {"job_id": job["id"], "status": job["status"]}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
 @app.post("/recommendations", response_model=List[RecommendationResponse])
 async def get_recommendations(request: RecommendationRequest):
     try:
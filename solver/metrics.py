@@ -0,0 +1,65 @@
+"""Prometheus histograms fed from the `stats` block of each SolverOutput"""
+
+from prometheus_client import CONTENT_TYPE_LATEST, Histogram, generate_latest
+
+PHASE_SECONDS = Histogram(
+    'solver_phase_seconds', 'Wall-clock time per solve phase', ['phase'],
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+MODEL_VARIABLES = Histogram(
+    'solver_model_variables', 'CP-SAT model variables per solve',
+    buckets=(100, 1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000),
+)
+MODEL_CONSTRAINTS = Histogram(
+    'solver_model_constraints', 'CP-SAT model constraints per solve',
+    buckets=(100, 1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000),
+)
+OBJECTIVE_TERMS = Histogram(
+    'solver_objective_terms', 'Objective terms per solve',
+    buckets=(10, 100, 1_000, 10_000, 100_000, 1_000_000),
+)
+SEARCH_CONFLICTS = Histogram(
+    'solver_search_conflicts', 'CP-SAT conflicts per solve',
+    buckets=(0, 10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000),
+)
+SEARCH_BRANCHES = Histogram(
+    'solver_search_branches', 'CP-SAT branches per solve',
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000),
+)
+RELATIVE_GAP = Histogram(
+    'solver_relative_gap', 'Relative gap between objective and best bound at the end of search',
+    buckets=(0, 0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1),
+)
+PEAK_RSS = Histogram(
+    'solver_peak_rss_megabytes', 'Peak resident memory of the worker process after a solve',
+    buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192),
+)
+
+
+def record_stats(stats: dict):
+    """Observe one solve's stats; merged outputs are recorded per component"""
+    for component in stats.get('components', []):
+        record_stats(component)
+    if 'timings' not in stats:
+        return
+
+    for phase, seconds in stats['timings'].items():
+        PHASE_SECONDS.labels(phase=phase).observe(seconds)
+    if 'model' not in stats:
+        return  # rejected by screening before a model was built
+    model = stats['model']
+    MODEL_VARIABLES.observe(model.get('variables', 0))
+    MODEL_CONSTRAINTS.observe(model.get('constraints', 0))
+    OBJECTIVE_TERMS.observe(model.get('objective_terms', 0))
+    search = stats.get('search', {})
+    SEARCH_CONFLICTS.observe(search.get('conflicts', 0))
+    SEARCH_BRANCHES.observe(search.get('branches', 0))
+    if search.get('gap') is not None:
+        RELATIVE_GAP.observe(search['gap'])
+    if 'peak_rss_mb' in stats:
+        PEAK_RSS.observe(stats['peak_rss_mb'])
+
+
+def render() -> tuple:
+    """(body, content type) for the /metrics endpoint"""
+    return generate_latest(), CONTENT_TYPE_LATEST
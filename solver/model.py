@@ -1,7 +1,19 @@
 from ortools.sat.python import cp_model
-from typing import List, Dict, Optional, Tuple, Set
+from typing import Callable, List, Dict, Optional, Tuple, Set
 from pydantic import BaseModel
 import logging
+import resource
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from itertools import chain
+
+from variables import VariableStore, KINDS, KIND_INDEX
+from expressions import LinearTerms
+from options import SolverOptions, resolve_options, apply_options, adaptive_time_limit, hard_time_limit
+from screening import screen
+from dumps import write_dump
 
 logger = logging.getLogger(__name__)
 
@@ -12,19 +24,110 @@ class SolverInput(BaseModel):
     offerings: List[dict]
     availability: List[dict]
     locked_assignments: List[dict] = []
+    # Published timetable to warm-start from; stability_weight > 0 penalizes moving it
+    current_assignments: List[dict] = []
+    stability_weight: int = 0
+    # Rooms out of use: {'slot_id', 'room_id'}, either one omitted meaning every slot/room;
+    # teachers out: {'slot_id', 'teacher_id'}, slot_id omitted meaning every slot
+    blackouts: List[dict] = []
+    solver_options: SolverOptions = SolverOptions()
 
 class SolverOutput(BaseModel):
     assignments: List[dict]
     objective: float
     penalties: dict
     skipped: List[dict]
+    stats: dict = {}
+    # Other timetables when options['alternatives'] > 0, best first: SolverOutput fields plus
+    # 'distance' (fewest sessions placed differently from any other timetable returned) and 'source'
+    alternatives: List[dict] = []
+
+class SolutionReporter(cp_model.CpSolverSolutionCallback):
+    """Records the objective of each improving solution over time, and passes the
+    solution to a callback, if given, with the diff against the previous one"""
+    
+    def __init__(self, solver: 'TimetableSolver', on_solution: Optional[Callable[[dict], None]] = None):
+        super().__init__()
+        self.solver = solver
+        self.on_solution = on_solution
+        self.start = time.monotonic()
+        self.previous = {}
+        self.count = 0
+        self.progress = []
+        self.last_improvement = self.start
+        self.stopped_by = None
+        # (placement literal values by index, output) of the latest solutions, for options['alternatives']
+        self.solutions = deque(maxlen=4 * solver.options['alternatives'])
+    
+    def watch(self, cp_solver: cp_model.CpSolver, budget: Optional[float], stall_time: float,
+              done: threading.Event):
+        """Once a solution exists, stop the search when the budget is spent or
+        no better solution came for stall_time seconds"""
+        while not done.wait(0.1):
+            if not self.count:
+                continue
+            now = time.monotonic()
+            if budget is not None and now - self.start >= budget:
+                self.stopped_by = 'budget'
+            elif stall_time and now - self.last_improvement >= stall_time:
+                self.stopped_by = 'stalled'
+            else:
+                continue
+            cp_solver.StopSearch()
+            return
+    
+    def on_solution_callback(self):
+        self.count += 1
+        self.last_improvement = time.monotonic()
+        elapsed = round(self.last_improvement - self.start, 3)
+        self.progress.append({'elapsed': elapsed, 'objective': self.ObjectiveValue(),
+                              'bound': self.BestObjectiveBound()})
+        if self.solutions.maxlen:
+            placements = chain(self.solver.store.x.values(), self.solver.store.y.values())
+            self.solutions.append(({var.Index(): self.Value(var) for var in placements},
+                                   self.solver._solution(self.Value, self.ObjectiveValue())))
+        if self.on_solution is None:
+            return
+        assignments = self.solver._extract_assignments(self.Value)
+        current = {(a['offering_id'], a['slot_id'], a['room_id'], a['kind']): a for a in assignments}
+        self.on_solution({
+            'solution': self.count,
+            'objective': self.ObjectiveValue(),
+            'bound': self.BestObjectiveBound(),
+            'elapsed': elapsed,
+            'added': [a for key, a in current.items() if key not in self.previous],
+            'removed': [a for key, a in self.previous.items() if key not in current],
+        })
+        self.previous = current
 
 class TimetableSolver:
-    def __init__(self, input_data: SolverInput):
+    def __init__(self, input_data: SolverInput, fixed_assignments: Optional[List[dict]] = None):
         self.input = input_data
         self.model = cp_model.CpModel()
-        self.variables = {}
-        self.lab_cluster_vars = {}
+        self.cp_solver = None
+        self.options = resolve_options(input_data.solver_options)
+        # Hard limit of the search; an adaptive budget may stop it sooner once a solution exists
+        self.time_limit = hard_time_limit(self.options)
+        self.stop_requested = False
+        self.timings = {}
+        
+        # Offerings placed here are held at these placements instead of being re-solved
+        self.fixed_assignments = fixed_assignments or []
+        self.unfixed_offerings = []
+        
+        # Greedy timetable used as the search hint when options['greedy_hint'] is on
+        self.greedy_assignments = []
+        self.hint_report = {}
+        
+        # When set, hard constraints are guarded per entity by these literals (see explain_infeasibility)
+        self.assumptions = None
+        
+        # A compiled model leaves locks and blackouts out, and assumes them per solve (see rebind)
+        self.compiled = False
+        self.built = False
+        self.blackout_literals = {}
+        self.symmetry_literals = []  # (offering indices of both sections, literal)
+        self.compile_report = {}
         
         # Create lookup dictionaries
         self.teacher_map = {t['id']: t for t in input_data.teachers}
@@ -46,398 +149,1135 @@ class TimetableSolver:
             if avail['can_teach']:
                 self.availability_set.add((avail['teacher_id'], avail['slot_id']))
         
-        # Group offerings by section and teacher
-        self.section_offerings = {}
-        self.teacher_offerings = {}
-        for offering in input_data.offerings:
-            section_id = offering['section']['id']
-            if section_id not in self.section_offerings:
-                self.section_offerings[section_id] = []
-            self.section_offerings[section_id].append(offering['id'])
+        self.store = VariableStore(self.model, input_data.offerings, input_data.slots, input_data.rooms)
+        
+        # Slot indices per day, in the order slots were given
+        self.day_slots = {}
+        for s, slot in enumerate(input_data.slots):
+            self.day_slots.setdefault(slot['day'], []).append(s)
+        
+        # Rooms the model cannot tell apart (same kind and capacity) form one
+        # pool, modelled by its first room and counted against its size
+        self.room_pool = list(range(len(input_data.rooms)))
+        self.pool_members = {r: [r] for r in range(len(input_data.rooms))}
+        if self.options['room_pools']:
+            first = {}
+            self.pool_members = {}
+            for r, room in enumerate(input_data.rooms):
+                pool = first.setdefault((room['kind'], room['capacity']), r)
+                self.room_pool[r] = pool
+                self.pool_members.setdefault(pool, []).append(r)
+        
+        # Rooms of the published timetable, kept where a pool or matching allows
+        self.current_rooms = {}
+        for assignment in input_data.current_assignments:
+            key = (self.store.offering_index.get(assignment['offering_id']),
+                   self.store.slot_index.get(assignment['slot_id']), assignment['kind'])
+            self.current_rooms[key] = self.store.room_index.get(assignment['room_id'])
+    
+    def stop(self):
+        """Ask a running CP-SAT search to stop and return its best solution so far"""
+        self.stop_requested = True
+        if self.cp_solver is not None:
+            self.cp_solver.StopSearch()
+    
+    def compute_domains(self) -> Dict[int, List[Tuple[int, int]]]:
+        """Feasible (slot, room) pairs per offering for lectures and tutorials.
+        
+        Applies teacher availability, classroom kind, room capacity and the
+        non-lab slot restriction up front so that create_variables never builds
+        a variable the hard constraints would pin to zero. Also fills
+        self.pruning_report with how many variables this avoided.
+        """
+        return {o: [(s, r) for s in slots for r in rooms]
+                for o, (slots, rooms) in self.compute_slot_room_domains().items()}
+    
+    def compute_slot_room_domains(self) -> Dict[int, Tuple[List[int], List[int]]]:
+        """Feasible slots and rooms per offering, whose product is its domain"""
+        class_rooms = [r for r, room in enumerate(self.input.rooms) if room['kind'] == 'CLASS']
+        theory_slots = [s for s, slot in enumerate(self.input.slots) if not slot['is_lab']]
+        
+        domains = {}
+        report = {'candidate_variables': 0, 'teacher_unavailable': 0, 'room_capacity': 0}
+        for o, offering in enumerate(self.input.offerings):
+            course = offering['course']
+            kinds = sum(1 for kind in ('L', 'T') if course[kind] > 0)
+            if kinds == 0:
+                continue
+            
+            teacher_id = offering['teacher']['id'] if offering['teacher'] else None
+            if teacher_id:
+                slots = [s for s in theory_slots
+                         if (teacher_id, self.store.slot_ids[s]) in self.availability_set]
+            else:
+                slots = theory_slots
+            
+            expected_size = offering.get('expected_size', 60)
+            rooms = [r for r in class_rooms if self.input.rooms[r]['capacity'] >= expected_size]
+            
+            domains[o] = (slots, [r for r in rooms if self.room_pool[r] == r])
+            
+            report['candidate_variables'] += len(theory_slots) * len(class_rooms) * kinds
+            report['teacher_unavailable'] += (len(theory_slots) - len(slots)) * len(class_rooms) * kinds
+            report['room_capacity'] += len(slots) * (len(class_rooms) - len(rooms)) * kinds
+        
+        report['pruned_variables'] = report['teacher_unavailable'] + report['room_capacity']
+        report['room_pools'] = len(self.pool_members)
+        report['locked_overrides'] = 0
+        self.pruning_report = report
+        return domains
+    
+    def _fixed_placements(self, domains: Dict[int, List[Tuple[int, int]]]) -> Dict[int, Tuple[Set, Set]]:
+        """X keys (slot, room, kind) and Y keys (cluster, room) per fixed offering.
+        
+        An offering is only held fixed when its placements cover the course
+        exactly and lie inside its domain; otherwise it is solved freely and
+        listed in self.unfixed_offerings.
+        """
+        store = self.store
+        by_offering = {}
+        for assignment in self.fixed_assignments:
+            o = store.offering_index.get(assignment['offering_id'])
+            if o is not None:
+                by_offering.setdefault(o, []).append(assignment)
+        
+        fixed = {}
+        for o, assignments in by_offering.items():
+            course = self.input.offerings[o]['course']
+            domain = set(domains.get(o, []))
+            x_keys, y_keys = set(), set()
+            valid = True
+            for assignment in assignments:
+                s = store.slot_index.get(assignment['slot_id'])
+                r = self._room_key(assignment['room_id'])
+                if s is None or r is None:
+                    valid = False
+                elif assignment['kind'] == 'P':
+                    c = store.slot_cluster[s]
+                    valid = valid and c is not None and self.input.rooms[r]['kind'] == 'LAB'
+                    y_keys.add((c, r))
+                else:
+                    valid = valid and (s, r) in domain
+                    x_keys.add((s, r, KIND_INDEX[assignment['kind']]))
+            
+            for kind in ('L', 'T'):
+                placed = sum(1 for _, _, k in x_keys if k == KIND_INDEX[kind])
+                valid = valid and placed == course[kind]
+            valid = valid and len(y_keys) == (1 if course['P'] > 0 else 0)
             
-            if offering['teacher']:
-                teacher_id = offering['teacher']['id']
-                if teacher_id not in self.teacher_offerings:
-                    self.teacher_offerings[teacher_id] = []
-                self.teacher_offerings[teacher_id].append(offering['id'])
+            if valid:
+                fixed[o] = (x_keys, y_keys)
+            else:
+                self.unfixed_offerings.append(store.offering_ids[o])
+        return fixed
     
     def create_variables(self):
-        # Decision variables X[offering_id, slot_id, room_id, kind]
-        for offering in self.input.offerings:
-            offering_id = offering['id']
+        store = self.store
+        lab_rooms = [r for r, room in enumerate(self.input.rooms)
+                     if room['kind'] == 'LAB' and self.room_pool[r] == r]
+        domains = self.compute_domains()
+        fixed = self._fixed_placements(domains)
+        
+        # Decision variables X[offering, slot, room, kind] and Y[offering, cluster, room]
+        for o, offering in enumerate(self.input.offerings):
             course = offering['course']
             
-            # Create variables for each type of session
+            if o in fixed:
+                # Only the fixed placements exist, so coverage forces them all to 1
+                x_keys, y_keys = fixed[o]
+                for s, r, k in x_keys:
+                    store.add_x(o, s, r, k)
+                for c, r in y_keys:
+                    store.add_y(o, c, r)
+                continue
+            
             for kind, count in [('L', course['L']), ('T', course['T']), ('P', course['P'])]:
-                if count > 0:
-                    if kind == 'P':
-                        # For practicals, create cluster variables
-                        for cluster_name, slot_ids in self.clusters.items():
-                            # Only consider lab rooms for practicals
-                            lab_rooms = [r for r in self.input.rooms if r['kind'] == 'LAB']
-                            for room in lab_rooms:
-                                var_name = f"Y_{offering_id}_{cluster_name}_{room['id']}"
-                                self.lab_cluster_vars[var_name] = self.model.NewBoolVar(var_name)
-                    else:
-                        # For lectures and tutorials
-                        for slot in self.input.slots:
-                            if not slot['is_lab']:  # Only non-lab slots
-                                for room in self.input.rooms:
-                                    if room['kind'] == 'CLASS':  # Only classrooms
-                                        var_name = f"X_{offering_id}_{slot['id']}_{room['id']}_{kind}"
-                                        self.variables[var_name] = self.model.NewBoolVar(var_name)
+                if count <= 0:
+                    continue
+                if kind == 'P':
+                    # For practicals, one variable per lab cluster and lab room
+                    for c in range(len(store.cluster_names)):
+                        for r in lab_rooms:
+                            store.add_y(o, c, r)
+                else:
+                    # Lectures and tutorials only inside the pruned domain
+                    k = KIND_INDEX[kind]
+                    for s, r in domains.get(o, []):
+                        store.add_x(o, s, r, k)
+        
+        # Locked assignments are honoured even when they fall outside the domain
+        for locked in self.input.locked_assignments:
+            key = self._locked_key(locked)
+            if None in key or key in store.x or locked['kind'] == 'P':
+                continue
+            o, s, r, k = key
+            if not self.input.slots[s]['is_lab'] and self.input.rooms[r]['kind'] == 'CLASS':
+                store.add_x(o, s, r, k)
+                self.pruning_report['locked_overrides'] += 1
+        
+        self.pruning_report['created_variables'] = store.num_variables
+        logger.info(
+            f"Created {store.num_variables} variables, pruned "
+            f"{self.pruning_report['pruned_variables']} of "
+            f"{self.pruning_report['candidate_variables']} lecture/tutorial candidates"
+        )
     
     def add_hard_constraints(self):
+        store = self.store
+        
         # 1. Coverage constraints - ensure each offering gets required L, T, P
-        for offering in self.input.offerings:
-            offering_id = offering['id']
+        for o, offering in enumerate(self.input.offerings):
             course = offering['course']
+            guard = self._guard('offering', offering['id'])
             
-            # Lecture coverage
-            if course['L'] > 0:
-                lecture_vars = []
-                for var_name, var in self.variables.items():
-                    if var_name.startswith(f"X_{offering_id}_") and var_name.endswith("_L"):
-                        lecture_vars.append(var)
-                if lecture_vars:
-                    self.model.Add(sum(lecture_vars) == course['L'])
-            
-            # Tutorial coverage
-            if course['T'] > 0:
-                tutorial_vars = []
-                for var_name, var in self.variables.items():
-                    if var_name.startswith(f"X_{offering_id}_") and var_name.endswith("_T"):
-                        tutorial_vars.append(var)
-                if tutorial_vars:
-                    self.model.Add(sum(tutorial_vars) == course['T'])
+            for kind in ('L', 'T'):
+                if course[kind] > 0:
+                    kind_vars = store.x_by_offering_kind.get((o, KIND_INDEX[kind]))
+                    if kind_vars:
+                        self.model.Add(cp_model.LinearExpr.sum(kind_vars) == course[kind]).OnlyEnforceIf(guard)
             
             # Practical coverage - exactly one cluster
             if course['P'] > 0:
-                cluster_vars = []
-                for var_name, var in self.lab_cluster_vars.items():
-                    if var_name.startswith(f"Y_{offering_id}_"):
-                        cluster_vars.append(var)
+                cluster_vars = [var for _, _, var in store.y_by_offering.get(o, [])]
                 if cluster_vars:
-                    self.model.Add(sum(cluster_vars) == 1)
+                    if guard:
+                        self.model.Add(cp_model.LinearExpr.sum(cluster_vars) == 1).OnlyEnforceIf(guard)
+                    else:
+                        self.model.AddExactlyOne(cluster_vars)
         
-        # 2. Teacher availability constraints
-        for offering in self.input.offerings:
-            if not offering['teacher']:
-                continue
-                
-            offering_id = offering['id']
-            teacher_id = offering['teacher']['id']
-            
-            for var_name, var in self.variables.items():
-                if var_name.startswith(f"X_{offering_id}_"):
-                    parts = var_name.split("_")
-                    slot_id = parts[2]
-                    if (teacher_id, slot_id) not in self.availability_set:
-                        self.model.Add(var == 0)
-        
-        # 3. Room capacity constraints
-        for offering in self.input.offerings:
-            offering_id = offering['id']
-            expected_size = offering.get('expected_size', 60)
-            
-            for var_name, var in self.variables.items():
-                if var_name.startswith(f"X_{offering_id}_"):
-                    parts = var_name.split("_")
-                    room_id = parts[3]
-                    room = self.room_map[room_id]
-                    if room['capacity'] < expected_size:
-                        self.model.Add(var == 0)
+        # 2. Teacher availability and 3. room capacity are enforced by the
+        # domains in create_variables, so no variable needs pinning to zero here
+        
+        num_slots = len(self.input.slots)
         
         # 4. No double-booking for teachers across different offerings
-        for teacher_id, offering_ids in self.teacher_offerings.items():
-            if len(offering_ids) < 2:
-                continue
-                
-            for slot in self.input.slots:
-                slot_id = slot['id']
-                teacher_slot_vars = []
-                
-                for offering_id in offering_ids:
-                    for var_name, var in self.variables.items():
-                        if var_name.startswith(f"X_{offering_id}_{slot_id}_"):
-                            teacher_slot_vars.append(var)
-                    
-                    # Also check lab clusters containing this slot
-                    for cluster_name, cluster_slots in self.clusters.items():
-                        if slot_id in cluster_slots:
-                            for var_name, var in self.lab_cluster_vars.items():
-                                if var_name.startswith(f"Y_{offering_id}_{cluster_name}_"):
-                                    teacher_slot_vars.append(var)
-                
-                if teacher_slot_vars:
-                    self.model.Add(sum(teacher_slot_vars) <= 1)
+        for t, teacher_id in enumerate(store.teacher_ids):
+            guard = self._guard('teacher', teacher_id)
+            for s in range(num_slots):
+                teacher_slot_vars = store.teacher_slot_vars(t, s)
+                if len(teacher_slot_vars) > 1:
+                    self._add_at_most_one(teacher_slot_vars, guard)
         
         # 5. No section conflicts - a section can only be in one place at a time
-        for section_id, offering_ids in self.section_offerings.items():
-            for slot in self.input.slots:
-                slot_id = slot['id']
-                section_slot_vars = []
-                
-                for offering_id in offering_ids:
-                    for var_name, var in self.variables.items():
-                        if var_name.startswith(f"X_{offering_id}_{slot_id}_"):
-                            section_slot_vars.append(var)
-                    
-                    # Check lab clusters
-                    for cluster_name, cluster_slots in self.clusters.items():
-                        if slot_id in cluster_slots:
-                            for var_name, var in self.lab_cluster_vars.items():
-                                if var_name.startswith(f"Y_{offering_id}_{cluster_name}_"):
-                                    section_slot_vars.append(var)
-                
-                if section_slot_vars:
-                    self.model.Add(sum(section_slot_vars) <= 1)
-        
-        # 6. Room single occupancy per slot
-        for slot in self.input.slots:
-            slot_id = slot['id']
-            for room in self.input.rooms:
-                room_id = room['id']
-                room_slot_vars = []
-                
-                for var_name, var in self.variables.items():
-                    if f"_{slot_id}_{room_id}_" in var_name:
-                        room_slot_vars.append(var)
-                
-                # Check lab clusters
-                for cluster_name, cluster_slots in self.clusters.items():
-                    if slot_id in cluster_slots:
-                        for var_name, var in self.lab_cluster_vars.items():
-                            if f"_{cluster_name}_{room_id}" in var_name:
-                                room_slot_vars.append(var)
-                
-                if room_slot_vars:
-                    self.model.Add(sum(room_slot_vars) <= 1)
+        for sec, section_id in enumerate(store.section_ids):
+            guard = self._guard('section', section_id)
+            for s in range(num_slots):
+                section_slot_vars = store.section_slot_vars(sec, s)
+                if len(section_slot_vars) > 1:
+                    self._add_at_most_one(section_slot_vars, guard)
         
-        # 7. Handle locked assignments
+        # 6. Room single occupancy per slot, or at most one session per room of a pool
+        for r, members in self.pool_members.items():
+            guard = self._guard('room', store.room_ids[r])
+            for s in range(num_slots):
+                room_slot_vars = store.room_slot_vars(s, r)
+                if len(room_slot_vars) > len(members):
+                    if len(members) == 1:
+                        self._add_at_most_one(room_slot_vars, guard)
+                    else:
+                        self.model.Add(cp_model.LinearExpr.sum(room_slot_vars) <= len(members)).OnlyEnforceIf(guard)
+        
+        # 7. Handle locked assignments and 8. blackouts, unless a compiled model assumes them per solve
+        if self.compiled:
+            return
         for locked in self.input.locked_assignments:
-            offering_id = locked['offering_id']
-            slot_id = locked['slot_id']
-            room_id = locked['room_id']
-            kind = locked['kind']
-            
-            var_name = f"X_{offering_id}_{slot_id}_{room_id}_{kind}"
-            if var_name in self.variables:
-                self.model.Add(self.variables[var_name] == 1)
+            var = self._locked_var(locked)
+            if var is not None:
+                guard = self._guard('locked', f"{locked['offering_id']}:{locked['kind']}:"
+                                              f"{locked['slot_id']}:{locked['room_id']}")
+                self.model.Add(var == 1).OnlyEnforceIf(guard)
+        for (s, pool), blocked in self.blackout_limits().items():
+            guard = self._guard('blackout', f"{store.slot_ids[s]}:{store.room_ids[pool]}")
+            self._add_blackout(s, pool, blocked, guard)
+        self.add_teacher_blackouts()
+    
+    def add_teacher_blackouts(self):
+        """No session of a teacher in the slots input.blackouts take them out of"""
+        store = self.store
+        for t, s in sorted(self.teacher_blackouts()):
+            variables = store.teacher_slot_vars(t, s)
+            if variables:
+                guard = self._guard('teacher_blackout', f"{store.teacher_ids[t]}:{store.slot_ids[s]}")
+                self.model.Add(cp_model.LinearExpr.sum(variables) == 0).OnlyEnforceIf(guard)
+    
+    def teacher_blackouts(self) -> Set[Tuple[int, int]]:
+        """(teacher, slot) index pairs that input.blackouts take out of use"""
+        store = self.store
+        pairs = set()
+        for blackout in self.input.blackouts:
+            t = store.teacher_index.get(blackout.get('teacher_id'))
+            if t is None:
+                continue
+            slots = [store.slot_index.get(blackout['slot_id'])] if blackout.get('slot_id') else \
+                range(len(store.slot_ids))
+            pairs.update((t, s) for s in slots if s is not None)
+        return pairs
+    
+    def blackout_pairs(self) -> Set[Tuple[int, int]]:
+        """(slot, room) index pairs that input.blackouts take out of use"""
+        store = self.store
+        pairs = set()
+        for blackout in self.input.blackouts:
+            if blackout.get('teacher_id'):
+                continue
+            slots = [store.slot_index.get(blackout['slot_id'])] if blackout.get('slot_id') else \
+                range(len(store.slot_ids))
+            rooms = [store.room_index.get(blackout['room_id'])] if blackout.get('room_id') else \
+                range(len(store.room_ids))
+            pairs.update((s, r) for s in slots for r in rooms if s is not None and r is not None)
+        return pairs
+    
+    def blackout_limits(self) -> Dict[Tuple[int, int], int]:
+        """Rooms out of use per (slot, pool)"""
+        limits = {}
+        for s, r in self.blackout_pairs():
+            key = (s, self.room_pool[r])
+            limits[key] = limits.get(key, 0) + 1
+        return limits
+    
+    def _add_blackout(self, s: int, pool: int, blocked: int, guard: list):
+        """At most the pool's rooms still in use hold sessions in this slot"""
+        room_slot_vars = self.store.room_slot_vars(s, pool)
+        limit = max(len(self.pool_members[pool]) - blocked, 0)
+        if len(room_slot_vars) > limit:
+            self.model.Add(cp_model.LinearExpr.sum(room_slot_vars) <= limit).OnlyEnforceIf(guard)
+    
+    def add_symmetry_breaking(self):
+        """Order the timetables of interchangeable sections.
+        
+        Sections whose offerings have the same courses, teachers and sizes
+        can swap timetables without changing feasibility or any penalty, so
+        for each such pair the weighted slot index of the first matching
+        offering must not decrease. Sections pinned by locks, the current
+        timetable or fixed placements are left alone.
+        """
+        store = self.store
+        pinned = {a['offering_id'] for a in self.input.locked_assignments + self.input.current_assignments +
+                  self.fixed_assignments}
+        
+        by_section = {}
+        for o, offering in enumerate(self.input.offerings):
+            by_section.setdefault(store.offering_section[o], []).append(o)
+        
+        groups = {}
+        for sec, offerings in by_section.items():
+            if any(store.offering_ids[o] in pinned for o in offerings):
+                continue
+            signature = []
+            for o in offerings:
+                offering = self.input.offerings[o]
+                course = offering['course']
+                signature.append((course['id'], offering['teacher']['id'] if offering['teacher'] else '',
+                                  offering.get('expected_size', 60), course['L'], course['T'], course['P'], o))
+            signature.sort()
+            groups.setdefault(tuple(item[:-1] for item in signature), []).append([item[-1] for item in signature])
+        
+        pairs = 0
+        for sections in groups.values():
+            for first, second in zip(sections, sections[1:]):
+                for a, b in zip(first, second):
+                    a_terms, b_terms = LinearTerms(), LinearTerms()
+                    for s, _, _, var in store.x_by_offering.get(a, []):
+                        a_terms.add(var, s)
+                    for s, _, _, var in store.x_by_offering.get(b, []):
+                        b_terms.add(var, s)
+                    if not len(a_terms):
+                        for c, _, var in store.y_by_offering.get(a, []):
+                            a_terms.add(var, c)
+                        for c, _, var in store.y_by_offering.get(b, []):
+                            b_terms.add(var, c)
+                    if len(a_terms) and len(b_terms):
+                        guard = []
+                        if self.compiled:
+                            # A later lock on either section would break the symmetry
+                            guard = [self.model.NewBoolVar(f"symmetry_{a}_{b}")]
+                            self.symmetry_literals.append((set(first) | set(second), guard[0]))
+                        self.model.Add(a_terms.expr() <= b_terms.expr()).OnlyEnforceIf(guard)
+                        pairs += 1
+                        break
+        self.pruning_report['symmetric_sections'] = pairs
+    
+    def _add_at_most_one(self, variables: List[cp_model.IntVar], guard: list):
+        """Native at-most-one, or a linear constraint when it needs an enforcement literal"""
+        if guard:
+            self.model.Add(cp_model.LinearExpr.sum(variables) <= 1).OnlyEnforceIf(guard)
+        else:
+            self.model.AddAtMostOne(variables)
+    
+    def _guard(self, family: str, entity_id: str) -> list:
+        """Enforcement literals for one constraint group: none unless explaining infeasibility"""
+        if self.assumptions is None:
+            return []
+        key = (family, entity_id)
+        if key not in self.assumptions:
+            self.assumptions[key] = self.model.NewBoolVar(f"assume_{family}_{entity_id}")
+        return [self.assumptions[key]]
+    
+    def explain_infeasibility(self, time_limit: float = 10.0) -> dict:
+        """Constraint groups that cannot all hold together.
+        
+        Rebuilds the hard constraints with one assumption literal per
+        offering's coverage, teacher, section, room and locked assignment,
+        takes CP-SAT's sufficient assumptions for infeasibility and then
+        drops groups one at a time while the rest stays infeasible. The
+        core is minimal unless the time limit ran out first.
+        """
+        start = time.monotonic()
+        diagnostic = type(self)(self.input, self.fixed_assignments)
+        diagnostic.assumptions = {}
+        diagnostic.create_variables()
+        diagnostic.add_hard_constraints()
+        literals = diagnostic.assumptions
+        by_index = {var.Index(): key for key, var in literals.items()}
+        
+        solver = cp_model.CpSolver()
+        # Assumption cores are only reported by a single search worker
+        solver.parameters.num_workers = 1
+        solver.parameters.random_seed = self.options['random_seed']
+        self.cp_solver = solver
+        
+        def check(keys):
+            diagnostic.model.ClearAssumptions()
+            diagnostic.model.AddAssumptions([literals[key] for key in keys])
+            solver.parameters.max_time_in_seconds = max(time_limit - (time.monotonic() - start), 0.01)
+            return solver.Solve(diagnostic.model)
+        
+        status = check(list(literals))
+        if status != cp_model.INFEASIBLE:
+            return {'status': solver.StatusName(status), 'core': [], 'minimal': False,
+                    'elapsed': round(time.monotonic() - start, 3)}
+        
+        core = [by_index[i] for i in solver.SufficientAssumptionsForInfeasibility()]
+        candidates = len(core)
+        minimal = True
+        i = 0
+        while i < len(core):
+            if time.monotonic() - start >= time_limit:
+                minimal = False
+                break
+            trial = core[:i] + core[i + 1:]
+            status = check(trial)
+            if status == cp_model.INFEASIBLE:
+                still_needed = {by_index[j] for j in solver.SufficientAssumptionsForInfeasibility()}
+                core = [key for key in trial if key in still_needed]
+            else:
+                if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+                    minimal = False
+                i += 1
+        
+        return {
+            'status': 'INFEASIBLE',
+            'core': [{'family': family, 'id': entity_id, 'description': self._describe_group(family, entity_id)}
+                     for family, entity_id in core],
+            'sufficient_assumptions': candidates,
+            'minimal': minimal,
+            'elapsed': round(time.monotonic() - start, 3),
+        }
+    
+    def _describe_group(self, family: str, entity_id: str) -> str:
+        if family == 'offering':
+            course = self.offering_map[entity_id]['course']
+            return f"Offering {entity_id} needs {course['L']}L/{course['T']}T/{course['P']}P sessions"
+        if family == 'locked':
+            offering_id, kind, slot_id, room_id = entity_id.split(':')
+            return f"Offering {offering_id} {kind} is locked to slot {slot_id} in room {room_id}"
+        if family == 'teacher_blackout':
+            teacher_id, slot_id = entity_id.split(':')
+            return f"Teacher {teacher_id} is out in slot {slot_id}"
+        if family == 'blackout':
+            slot_id, room_id = entity_id.split(':')
+            pool = self.store.room_index[room_id]
+            members = self.pool_members[pool]
+            if len(members) == 1:
+                return f"Room {room_id} is out of use in slot {slot_id}"
+            blocked = self.blackout_limits().get((self.store.slot_index[slot_id], pool), 0)
+            rooms = ', '.join(self.store.room_ids[r] for r in members)
+            return f"{blocked} of rooms {rooms} are out of use in slot {slot_id}"
+        if family == 'room':
+            members = self.pool_members[self.store.room_index[entity_id]]
+            if len(members) > 1:
+                rooms = ', '.join(self.store.room_ids[r] for r in members)
+                return f"Rooms {rooms} can hold at most {len(members)} sessions per slot"
+        if family == 'rooms':
+            # Room counts of the two-stage formulation, per lab cluster or lecture slot
+            blocked = self.blackout_pairs()
+            if entity_id in self.clusters:
+                cluster = set(self.store.cluster_slots[self.store.cluster_index[entity_id]])
+                labs = sum(1 for r, room in enumerate(self.input.rooms) if room['kind'] == 'LAB'
+                           and not any((s, r) in blocked for s in cluster))
+                return f"Lab cluster {entity_id} can hold at most {labs} practicals, one per lab room in use"
+            s = self.store.slot_index[entity_id]
+            rooms = sum(1 for r, room in enumerate(self.input.rooms) if room['kind'] == 'CLASS'
+                        and (s, r) not in blocked)
+            return f"Slot {entity_id} can hold at most {rooms} lectures and tutorials, one per classroom in use"
+        return f"{family.capitalize()} {entity_id} can hold at most one session per slot"
+    
+    def _locked_key(self, locked: dict) -> Tuple:
+        """Index key (offering, slot, room, kind) of a locked assignment"""
+        store = self.store
+        return (
+            store.offering_index.get(locked['offering_id']),
+            store.slot_index.get(locked['slot_id']),
+            self._room_key(locked['room_id']),
+            KIND_INDEX.get(locked['kind']),
+        )
+    
+    def _room_key(self, room_id: str) -> Optional[int]:
+        """Index of the room, or of the first room of its pool"""
+        r = self.store.room_index.get(room_id)
+        return self.room_pool[r] if r is not None else None
+    
+    def _locked_var(self, locked: dict):
+        """Variable for a locked X assignment, or None if it is not in the model"""
+        return self.store.x.get(self._locked_key(locked))
+    
+    def _assignment_var(self, assignment: dict):
+        """X variable, or Y variable for a lab, that places this assignment, if modelled"""
+        store = self.store
+        if assignment['kind'] != 'P':
+            return self._locked_var(assignment)
+        s = store.slot_index.get(assignment['slot_id'])
+        c = store.slot_cluster[s] if s is not None else None
+        return store.y.get((
+            store.offering_index.get(assignment['offering_id']),
+            c,
+            self._room_key(assignment['room_id']),
+        ))
+    
+    def _current_vars(self, include_locked: bool = True) -> Dict[int, cp_model.IntVar]:
+        """Variables set in the current timetable, keyed by variable index"""
+        locked = {(a['offering_id'], a['slot_id'], a['kind']) for a in self.input.locked_assignments}
+        current = {}
+        for assignment in self.input.current_assignments:
+            is_locked = assignment.get('is_locked') or \
+                (assignment['offering_id'], assignment['slot_id'], assignment['kind']) in locked
+            if is_locked and not include_locked:
+                continue
+            var = self._assignment_var(assignment)
+            if var is not None:
+                current[var.Index()] = var
+        return current
+    
+    def add_solution_hints(self):
+        """Hint CP-SAT with the current timetable so small edits re-solve quickly,
+        or else with the greedy timetable"""
+        if self.input.current_assignments:
+            current = self._current_vars()
+        elif self.greedy_assignments:
+            current = {}
+            for assignment in self.greedy_assignments:
+                var = self._assignment_var(assignment)
+                if var is not None:
+                    current[var.Index()] = var
+            self.hint_report = {'assignments': len(self.greedy_assignments), 'hinted_variables': len(current)}
+        else:
+            return
+        for var in list(self.store.x.values()) + list(self.store.y.values()):
+            self.model.AddHint(var, 1 if var.Index() in current else 0)
+    
+    def run_greedy(self) -> List[dict]:
+        """Timetable from the greedy ConstraintSolver, which needs well under a second"""
+        from advanced_solver import ConstraintSolver
+        from portfolio import heuristic_data
+        return ConstraintSolver(heuristic_data(self.input.model_dump())).solve()['assignments']
     
     def add_soft_objectives(self):
-        penalties = []
+        store = self.store
         
-        # 1. Teacher preferences
-        teacher_pref_penalties = []
-        for offering in self.input.offerings:
+        # 1. Teacher preferences, as one penalty per slot for each offering
+        # so that the loop over variables is a list lookup
+        teacher_pref_penalties = LinearTerms()
+        for o, offering in enumerate(self.input.offerings):
             if not offering['teacher']:
                 continue
                 
-            offering_id = offering['id']
-            teacher = offering['teacher']
-            prefs = teacher.get('prefs', {})
+            prefs = offering['teacher'].get('prefs', {})
+            prefer_days = prefs.get('prefer_days', [])
+            slot_penalty = []
+            for slot in self.input.slots:
+                penalty = 0
+                # Avoid 8am preference
+                if prefs.get('avoid_8am') and slot['start_time'] == '08:00':
+                    penalty += 5
+                # Avoid late preference
+                if prefs.get('avoid_late') and slot['start_time'] >= '17:00':
+                    penalty += 5
+                # Preferred days
+                if prefer_days and slot['day'] not in prefer_days:
+                    penalty += 2
+                slot_penalty.append(penalty)
+            if not any(slot_penalty):
+                continue
             
-            for var_name, var in self.variables.items():
-                if var_name.startswith(f"X_{offering_id}_"):
-                    parts = var_name.split("_")
-                    slot_id = parts[2]
-                    slot = self.slot_map[slot_id]
-                    
-                    # Avoid 8am preference
-                    if prefs.get('avoid_8am') and slot['start_time'] == '08:00':
-                        teacher_pref_penalties.append(var * 5)
-                    
-                    # Avoid late preference
-                    if prefs.get('avoid_late') and slot['start_time'] >= '17:00':
-                        teacher_pref_penalties.append(var * 5)
-                    
-                    # Preferred days
-                    prefer_days = prefs.get('prefer_days', [])
-                    if prefer_days and slot['day'] not in prefer_days:
-                        teacher_pref_penalties.append(var * 2)
+            for s, _, _, var in store.x_by_offering.get(o, []):
+                if slot_penalty[s]:
+                    teacher_pref_penalties.add(var, slot_penalty[s])
+        
+        # Occupancy indicators shared by the load, gap and spread terms. Hard
+        # constraints allow at most one session per teacher/section and slot,
+        # so each indicator equals the sum of the variables it covers.
+        self.teacher_busy = {}  # (teacher, slot) -> teaches a lecture or tutorial
+        for (t, s), slot_vars in store.x_by_teacher_slot.items():
+            if slot_vars:
+                self.teacher_busy[(t, s)] = self._indicator(slot_vars, f"teacher_busy_{t}_{s}")
+        self.section_busy = {}  # (section, slot) -> has any session, labs included
+        for sec in range(len(store.section_ids)):
+            for s in range(len(self.input.slots)):
+                slot_vars = store.section_slot_vars(sec, s)
+                if slot_vars:
+                    self.section_busy[(sec, s)] = self._indicator(slot_vars, f"section_busy_{sec}_{s}")
         
         # 2. Max classes per day/week constraints
-        max_per_day_penalties = []
-        max_per_week_penalties = []
+        max_per_day_penalties = LinearTerms()
+        max_per_week_penalties = LinearTerms()
         
         for teacher in self.input.teachers:
             teacher_id = teacher['id']
             max_per_day = teacher.get('max_per_day', 3)
             max_per_week = teacher.get('max_per_week', 12)
             
-            if teacher_id not in self.teacher_offerings:
+            t = store.teacher_index.get(teacher_id)
+            if t is None:
                 continue
             
             # Per day constraints
+            week_vars = []
             for day in ['MON', 'TUE', 'WED', 'THU', 'FRI']:
-                day_slots = [s for s in self.input.slots if s['day'] == day]
-                day_vars = []
-                
-                for slot in day_slots:
-                    for offering_id in self.teacher_offerings[teacher_id]:
-                        for var_name, var in self.variables.items():
-                            if var_name.startswith(f"X_{offering_id}_{slot['id']}_"):
-                                day_vars.append(var)
+                day_vars = [self.teacher_busy[(t, s)] for s in self.day_slots.get(day, [])
+                            if (t, s) in self.teacher_busy]
+                week_vars.extend(day_vars)
                 
                 if len(day_vars) > max_per_day:
-                    excess = self.model.NewIntVar(0, len(day_vars), f"excess_day_{teacher_id}_{day}")
-                    self.model.Add(excess >= sum(day_vars) - max_per_day)
-                    max_per_day_penalties.append(excess * 10)
+                    excess = self.model.NewIntVar(0, len(day_vars), f"excess_day_{t}_{day}")
+                    self.model.Add(cp_model.LinearExpr.sum(day_vars) - excess <= max_per_day)
+                    max_per_day_penalties.add(excess, 10)
             
             # Per week constraints
-            week_vars = []
-            for offering_id in self.teacher_offerings[teacher_id]:
-                for var_name, var in self.variables.items():
-                    if var_name.startswith(f"X_{offering_id}_"):
-                        week_vars.append(var)
-            
             if len(week_vars) > max_per_week:
-                excess = self.model.NewIntVar(0, len(week_vars), f"excess_week_{teacher_id}")
-                self.model.Add(excess >= sum(week_vars) - max_per_week)
-                max_per_week_penalties.append(excess * 20)
+                excess = self.model.NewIntVar(0, len(week_vars), f"excess_week_{t}")
+                self.model.Add(cp_model.LinearExpr.sum(week_vars) - excess <= max_per_week)
+                max_per_week_penalties.add(excess, 20)
         
-        # 3. Minimize gaps in section schedules
-        gap_penalties = []
-        for section_id, offering_ids in self.section_offerings.items():
+        # 3. Minimize gaps in section schedules: every block of sessions after
+        # the first on a day starts after an idle period
+        gap_penalties = LinearTerms()
+        for sec in range(len(store.section_ids)):
             for day in ['MON', 'TUE', 'WED', 'THU', 'FRI']:
-                day_slots = sorted([s for s in self.input.slots if s['day'] == day], 
-                                 key=lambda x: x['start_time'])
-                
-                if len(day_slots) < 2:
+                day_slots = sorted(self.day_slots.get(day, []),
+                                   key=lambda s: self.input.slots[s]['start_time'])
+                busy = [self.section_busy.get((sec, s)) for s in day_slots]
+                if sum(var is not None for var in busy) < 2:
                     continue
                 
-                for i in range(len(day_slots) - 1):
-                    slot1 = day_slots[i]
-                    slot2 = day_slots[i + 1]
-                    
-                    # Check if there's a gap
-                    slot1_occupied = []
-                    slot2_occupied = []
-                    
-                    for offering_id in offering_ids:
-                        for var_name, var in self.variables.items():
-                            if var_name.startswith(f"X_{offering_id}_{slot1['id']}_"):
-                                slot1_occupied.append(var)
-                            if var_name.startswith(f"X_{offering_id}_{slot2['id']}_"):
-                                slot2_occupied.append(var)
-                    
-                    if slot1_occupied and slot2_occupied:
-                        # Penalize if slot1 is occupied but slot2 is not (gap)
-                        gap_var = self.model.NewBoolVar(f"gap_{section_id}_{day}_{i}")
-                        self.model.Add(sum(slot1_occupied) >= 1).OnlyEnforceIf(gap_var)
-                        self.model.Add(sum(slot2_occupied) == 0).OnlyEnforceIf(gap_var)
-                        gap_penalties.append(gap_var * 3)
-        
-        # Combine all penalties
-        total_penalty = sum(teacher_pref_penalties) + sum(max_per_day_penalties) + \
-                       sum(max_per_week_penalties) + sum(gap_penalties)
-        
-        self.model.Minimize(total_penalty)
+                # Section teaches on this day
+                on_day = self.model.NewBoolVar(f"on_day_{sec}_{day}")
+                self.model.Add(on_day <= cp_model.LinearExpr.sum([var for var in busy if var is not None]))
+                
+                starts = []
+                for i, var in enumerate(busy):
+                    if var is None:
+                        continue
+                    if i > 0 and busy[i - 1] is not None:
+                        start = self.model.NewBoolVar(f"block_{sec}_{day}_{i}")
+                        self.model.Add(start >= var - busy[i - 1])
+                        starts.append(start)
+                    else:
+                        starts.append(var)
+                
+                gaps = self.model.NewIntVar(0, len(starts) - 1, f"gaps_{sec}_{day}")
+                self.model.Add(cp_model.LinearExpr.sum(starts) - on_day - gaps <= 0)
+                gap_penalties.add(gaps, 3)
         
-        # Store penalty components for reporting
-        self.penalty_components = {
-            'teacher_prefs': sum(teacher_pref_penalties),
-            'max_per_day': sum(max_per_day_penalties),
-            'max_per_week': sum(max_per_week_penalties),
-            'gaps': sum(gap_penalties),
-            'spread': 0  # Could add lecture spread penalty
+        # 4. Lecture spread - one session of an offering per day
+        spread_penalties = LinearTerms()
+        slot_days = [slot['day'] for slot in self.input.slots]
+        for o, offering in enumerate(self.input.offerings):
+            sessions = offering['course']['L'] + offering['course']['T']
+            if sessions < 2:
+                continue
+            by_day = {}
+            for s, _, _, var in store.x_by_offering.get(o, []):
+                by_day.setdefault(slot_days[s], []).append(var)
+            for day, day_vars in by_day.items():
+                if len(day_vars) > 1:
+                    excess = self.model.NewIntVar(0, sessions - 1, f"excess_spread_{o}_{day}")
+                    self.model.Add(cp_model.LinearExpr.sum(day_vars) - excess <= 1)
+                    spread_penalties.add(excess, 4)
+        
+        # 5. Stability - penalize moving unlocked assignments of the current timetable
+        stability_penalties = LinearTerms()
+        if self.input.stability_weight > 0:
+            current = list(self._current_vars(include_locked=False).values())
+            # Sum of (1 - var) * weight
+            stability_penalties.add_constant(self.input.stability_weight * len(current))
+            stability_penalties.add_all(current, -self.input.stability_weight)
+        
+        components = {
+            'teacher_prefs': teacher_pref_penalties,
+            'max_per_day': max_per_day_penalties,
+            'max_per_week': max_per_week_penalties,
+            'gaps': gap_penalties,
+            'spread': spread_penalties,
+            'stability': stability_penalties,
         }
-    
-    def solve(self) -> SolverOutput:
-        self.create_variables()
-        self.add_hard_constraints()
-        self.add_soft_objectives()
         
-        solver = cp_model.CpSolver()
-        solver.parameters.max_time_in_seconds = 30.0
-        status = solver.Solve(self.model)
+        # Combine all penalties into one flat expression
+        total_penalty = LinearTerms()
+        for terms in components.values():
+            total_penalty.extend(terms)
+        self.model.Minimize(total_penalty.expr())
         
+        # Store penalty components for reporting
+        self.penalty_components = components
+    
+    def _indicator(self, variables: List[cp_model.IntVar], name: str):
+        """0/1 variable equal to the sum of at most one true variable; the variable itself if alone"""
+        if len(variables) == 1:
+            return variables[0]
+        var = self.model.NewBoolVar(name)
+        self.model.Add(cp_model.LinearExpr.sum(variables) == var)
+        return var
+    
+    def _extract_assignments(self, value: Callable) -> List[dict]:
+        """Assignments set in a solution, read through `value` (CpSolver or callback Value)"""
+        store = self.store
         assignments = []
-        skipped = []
         
-        if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
-            # Extract regular assignments
-            for var_name, var in self.variables.items():
-                if solver.Value(var) == 1:
-                    parts = var_name.split("_")
+        # Extract regular assignments, giving each pooled session a concrete room:
+        # its locked room, then its current room, then the free room that best
+        # covers its needs
+        taken = self.blackout_pairs()
+        chosen = {}
+        for locked in self.input.locked_assignments:
+            key = self._locked_key(locked)
+            r = store.room_index.get(locked['room_id'])
+            if key in store.x and r is not None and value(store.x[key]) == 1:
+                chosen[key] = r
+                taken.add((key[1], r))
+        for key, var in store.x.items():
+            if key in chosen or value(var) != 1:
+                continue
+            o, s, r, k = key
+            chosen[key] = self._pick_room(o, [s], r, KINDS[k], taken)
+        
+        for (o, s, r, k), room in chosen.items():
+            assignments.append({
+                'offering_id': store.offering_ids[o],
+                'slot_id': store.slot_ids[s],
+                'room_id': store.room_ids[room],
+                'kind': KINDS[k],
+                'is_locked': False
+            })
+        
+        # Extract lab assignments from cluster variables
+        for (o, c, r), var in store.y.items():
+            if value(var) == 1:
+                room = self._pick_room(o, store.cluster_slots[c], r, 'P', taken)
+                # Add all slots in the cluster
+                for s in store.cluster_slots[c]:
                     assignments.append({
-                        'offering_id': parts[1],
-                        'slot_id': parts[2],
-                        'room_id': parts[3],
-                        'kind': parts[4],
+                        'offering_id': store.offering_ids[o],
+                        'slot_id': store.slot_ids[s],
+                        'room_id': store.room_ids[room],
+                        'kind': 'P',
                         'is_locked': False
                     })
-            
-            # Extract lab assignments from cluster variables
-            for var_name, var in self.lab_cluster_vars.items():
-                if solver.Value(var) == 1:
-                    parts = var_name.split("_")
-                    offering_id = parts[1]
-                    cluster_name = parts[2]
-                    room_id = parts[3]
-                    
-                    # Add all slots in the cluster
-                    for slot_id in self.clusters[cluster_name]:
-                        assignments.append({
-                            'offering_id': offering_id,
-                            'slot_id': slot_id,
-                            'room_id': room_id,
-                            'kind': 'P',
-                            'is_locked': False
-                        })
-            
-            # Preserve locked assignments
-            for locked in self.input.locked_assignments:
-                # Remove any conflicting assignment
-                assignments = [a for a in assignments if not (
-                    a['offering_id'] == locked['offering_id'] and
-                    a['kind'] == locked['kind'] and
-                    a['slot_id'] == locked['slot_id']
-                )]
-                assignments.append(locked)
-            
-            # Check for skipped items
-            for offering in self.input.offerings:
-                course = offering['course']
-                offering_id = offering['id']
-                
-                for kind, required in [('L', course['L']), ('T', course['T']), ('P', course['P'])]:
-                    if required > 0:
-                        scheduled = len([a for a in assignments if 
-                                       a['offering_id'] == offering_id and a['kind'] == kind])
-                        if scheduled < required:
-                            skipped.append({
-                                'offering_id': offering_id,
-                                'kind': kind,
-                                'reason': f"Could only schedule {scheduled}/{required} {kind} sessions"
-                            })
-            
-            objective = solver.ObjectiveValue()
-            
-            # Calculate penalty breakdown
-            penalties = {
-                'teacher_prefs': 0,
-                'max_per_day': 0,
-                'max_per_week': 0,
-                'gaps': 0,
-                'spread': 0
-            }
-            
-            return SolverOutput(
-                assignments=assignments,
-                objective=objective,
-                penalties=penalties,
-                skipped=skipped
-            )
+        return assignments
+    
+    def _pick_room(self, o: int, slots: List[int], pool: int, kind: str, taken: Set) -> int:
+        """A room of the pool free in all these slots, which is then marked taken"""
+        members = self.pool_members[pool]
+        if len(members) > 1:
+            free = [r for r in members if all((s, r) not in taken for s in slots)] or members
+            current = self.current_rooms.get((o, slots[0], kind))
+            if current in free:
+                room = current
+            else:
+                needs = self.input.offerings[o].get('needs') or []
+                room = min(free, key=lambda r: sum(1 for need in needs
+                                                    if need not in (self.input.rooms[r].get('tags') or [])))
+        else:
+            room = pool
+        taken.update((s, room) for s in slots)
+        return room
+    
+    @contextmanager
+    def _phase(self, name: str):
+        """Record the wall-clock time of one solve phase in self.timings"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round(time.perf_counter() - start, 4)
+    
+    def _output_stats(self, solver: cp_model.CpSolver, status) -> dict:
+        """Phase timings, model size, CP-SAT search statistics and peak memory"""
+        proto = self.model.Proto()
+        objective = solver.ObjectiveValue() if status in (cp_model.OPTIMAL, cp_model.FEASIBLE) else None
+        bound = solver.BestObjectiveBound()
+        gap = None
+        if objective is not None:
+            gap = abs(objective - bound) / max(abs(objective), 1e-9) if objective else 0.0
+        return {
+            'pruning': self.pruning_report,
+            'solver_options': self.options,
+            'timings': dict(self.timings, total=round(sum(self.timings.values()), 4)),
+            'model': {
+                'variables': len(proto.variables),
+                'constraints': len(proto.constraints),
+                'objective_terms': len(proto.objective.vars),
+            },
+            'search': {
+                'status': solver.StatusName(status),
+                'conflicts': solver.NumConflicts(),
+                'branches': solver.NumBranches(),
+                'wall_time': solver.WallTime(),
+                'best_bound': bound,
+                'gap': gap,
+            },
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+    
+    def build(self):
+        """Build the model unless it already is, timing each phase"""
+        if self.built:
+            return
+        if self.options['greedy_hint'] and not self.input.current_assignments:
+            with self._phase('greedy_hint'):
+                self.greedy_assignments = self.run_greedy()
+        
+        with self._phase('create_variables'):
+            self.create_variables()
+        with self._phase('add_hard_constraints'):
+            self.add_hard_constraints()
+            if self.options['symmetry_breaking']:
+                self.add_symmetry_breaking()
+        with self._phase('add_soft_objectives'):
+            self.add_soft_objectives()
+            self.add_solution_hints()
+        self.built = True
+    
+    def solve(self, on_solution: Optional[Callable[[dict], None]] = None) -> SolverOutput:
+        """Build and solve the model.
+        
+        If on_solution is given it is called with every improving solution
+        found during search (see SolutionReporter). Inputs that fail
+        screening are rejected before any model is built. With
+        options['greedy_hint'] and no current timetable, the greedy
+        ConstraintSolver runs first and its timetable is the search hint.
+        A compiled model is built on the first call only; later calls
+        (see rebind) just change its assumptions.
+        """
+        self.timings = {}
+        screening = None
+        if self.options['screening']:
+            with self._phase('screening'):
+                screening = screen(self.input)
+            if not screening['feasible']:
+                return self._screening_output(screening)
+        
+        reused = self.built
+        self.build()
+        
+        if self.compiled:
+            with self._phase('assumptions'):
+                literals = self._compiled_assumptions()
+                self.model.ClearAssumptions()
+                self.model.AddAssumptions(literals)
+            self.compile_report = {'reused': reused, 'assumptions': len(literals)}
+        
+        budget = None
+        if self.options['time_budget'] == 'adaptive':
+            budget = min(self.time_limit, adaptive_time_limit(
+                self.options, len(self.model.Proto().variables), len(self.input.offerings)))
+        
+        solver = cp_model.CpSolver()
+        apply_options(solver.parameters, self.options)
+        # options keep the requested time_limit; the search stops at the effective one
+        solver.parameters.max_time_in_seconds = self.time_limit
+        if self.greedy_assignments:
+            # The greedy timetable may break hard constraints the model has
+            solver.parameters.repair_hint = True
+        self.cp_solver = solver
+        reporter = SolutionReporter(self, on_solution)
+        done = threading.Event()
+        if budget is not None or self.options['stall_time']:
+            threading.Thread(target=reporter.watch, args=(solver, budget, self.options['stall_time'], done),
+                             daemon=True).start()
+        with self._phase('search'):
+            status = solver.Solve(self.model, reporter)
+        done.set()
+        
+        alternatives = None
+        if self.options['alternatives'] and status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            with self._phase('alternatives'):
+                alternatives, alternatives_report = self.find_alternatives(solver, reporter)
+        
+        with self._phase('extraction'):
+            output = self._build_output(solver, status)
+        output.stats = self._output_stats(solver, status)
+        output.stats['search']['first_solution_time'] = \
+            reporter.progress[0]['elapsed'] if reporter.progress else None
+        output.stats['search']['progress'] = reporter.progress
+        output.stats['search']['stop_reason'] = self._stop_reason(status, output.stats['search']['gap'], reporter)
+        output.stats['search']['time_budget'] = {
+            'mode': self.options['time_budget'],
+            'budget': budget,
+            'time_limit': self.options['time_limit'],
+            'effective_time_limit': self.time_limit,
+            'relative_gap_limit': self.options['relative_gap_limit'],
+            'stall_time': self.options['stall_time'],
+        }
+        if self.hint_report:
+            output.stats['greedy_hint'] = self.hint_report
+        if alternatives is not None:
+            output.alternatives = alternatives
+            output.stats['alternatives'] = alternatives_report
+        if self.compiled:
+            output.stats['compiled'] = self.compile_report
+        
+        if status == cp_model.INFEASIBLE:
+            with self._phase('diagnosis'):
+                explanation = self.explain_infeasibility(min(self.time_limit, 10.0))
+            output.stats['infeasible_core'] = explanation
+            output.stats['timings'] = dict(self.timings, total=round(sum(self.timings.values()), 4))
+            output.skipped.extend({
+                'offering_id': group['id'].split(':')[0] if group['family'] in ('offering', 'locked') else 'all',
+                'kind': 'all',
+                'reason': f"Conflicting constraint: {group['description']}",
+            } for group in explanation['core'])
+        if screening is not None:
+            output.stats['screening'] = screening
+        dump = write_dump(self, output, solver.parameters)
+        if dump:
+            output.stats['dump'] = dump
+        return output
+    
+    def rebind(self, input_data: SolverInput) -> bool:
+        """Point a compiled solver at another input of the same dataset version.
+        
+        Only locks, blackouts and search parameters may differ from the input
+        it was built for. Returns False, leaving the solver unchanged, when a
+        locked lecture falls outside the compiled domain: only a rebuilt model
+        has a variable for it.
+        """
+        for locked in input_data.locked_assignments:
+            key = self._locked_key(locked)
+            if None in key or locked['kind'] == 'P' or key in self.store.x:
+                continue
+            o, s, r, k = key
+            if not self.input.slots[s]['is_lab'] and self.input.rooms[r]['kind'] == 'CLASS':
+                return False
+        self.input = input_data
+        self.options = resolve_options(input_data.solver_options)
+        self.time_limit = hard_time_limit(self.options)
+        self.stop_requested = False
+        self.cp_solver = None
+        return True
+    
+    def _placement_literals(self) -> Dict[Tuple, List[cp_model.IntVar]]:
+        """X literals by (offering, slot, kind) and Y literals by (offering, cluster),
+        whatever the room: a placement is where in the week a session happens"""
+        literals = {}
+        for (o, s, _, k), var in self.store.x.items():
+            literals.setdefault((o, s, k), []).append(var)
+        for (o, c, _), var in self.store.y.items():
+            literals.setdefault((o, c), []).append(var)
+        return literals
+    
+    def _placements(self, value: Callable, literals: Dict[Tuple, List[cp_model.IntVar]]) -> frozenset:
+        """Placements taken in a solution"""
+        return frozenset(key for key, variables in literals.items() if any(value(var) for var in variables))
+    
+    def find_alternatives(self, solver: cp_model.CpSolver, reporter: SolutionReporter) -> Tuple[List[dict], dict]:
+        """Up to options['alternatives'] timetables, each at least options['min_distance']
+        placements away from the best solution and from one another.
+        
+        Each follow-up search runs on a copy of the model with a no-good cut
+        around every timetable chosen so far, starting from a hint of the best
+        one. Improving solutions met during the main search, best objective
+        first, fill any places the follow-ups cannot.
+        """
+        wanted, distance = self.options['alternatives'], self.options['min_distance']
+        literals = self._placement_literals()
+        chosen = [self._placements(solver.Value, literals)]
+        found = []
+        report = {'requested': wanted, 'min_distance': distance, 'from_search': 0, 'follow_up_searches': 0}
+        
+        model = self.model.Clone()
+        model.ClearHints()
+        for i in range(len(model.Proto().variables)):
+            var = model.GetIntVarFromProtoIndex(i)
+            model.AddHint(var, solver.Value(var))
+        cut = 0
+        while len(found) < wanted and not self.stop_requested:
+            for placements in chosen[cut:]:
+                kept = [model.GetBoolVarFromProtoIndex(var.Index()) for key in placements for var in literals[key]]
+                model.Add(cp_model.LinearExpr.sum(kept) <= len(placements) - distance)
+            cut = len(chosen)
+            follow_up = cp_model.CpSolver()
+            apply_options(follow_up.parameters, dict(
+                self.options, time_limit=min(self.options['alternative_time_limit'], self.time_limit)))
+            # The hint breaks the cuts; repairing it finds a timetable close to the best one
+            follow_up.parameters.repair_hint = True
+            self.cp_solver = follow_up
+            status = follow_up.Solve(model)
+            report['follow_up_searches'] += 1
+            if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+                report['last_status'] = follow_up.StatusName(status)
+                break
+            placements = self._placements(follow_up.Value, literals)
+            chosen.append(placements)
+            found.append((placements, self._solution(follow_up.Value, follow_up.ObjectiveValue()), 'follow_up'))
+        
+        for values, output in sorted(reporter.solutions, key=lambda item: item[1].objective):
+            placements = self._placements(lambda var: values[var.Index()], literals)
+            if len(found) == wanted:
+                break
+            if min(len(placements - other) for other in chosen) >= distance:
+                chosen.append(placements)
+                found.append((placements, output, 'search'))
+                report['from_search'] += 1
+        
+        alternatives = []
+        for placements, output, source in sorted(found, key=lambda item: item[1].objective):
+            alternatives.append(dict(
+                output.model_dump(exclude={'stats', 'alternatives'}),
+                distance=min(len(placements - other) for other in chosen if other is not placements),
+                source=source,
+            ))
+        report['found'] = len(alternatives)
+        return alternatives, report
+    
+    def _stop_reason(self, status, gap: Optional[float], reporter: SolutionReporter) -> str:
+        """Why the search ended: optimal, gap (within relative_gap_limit), budget
+        (adaptive), stalled, cancelled, infeasible, or time_limit"""
+        if status == cp_model.INFEASIBLE:
+            return 'infeasible'
+        if status == cp_model.OPTIMAL:
+            return 'optimal' if not gap else 'gap'
+        if reporter.stopped_by:
+            return reporter.stopped_by
+        if self.stop_requested:
+            return 'cancelled'
+        return 'time_limit'
+    
+    def _compiled_assumptions(self) -> List[cp_model.IntVar]:
+        """Literals that apply this input's locks and blackouts to the compiled model.
+        
+        A room blackout literal enforces one (slot, pool, rooms out of use)
+        limit; it is added to the model the first time any input needs it and
+        only assumed after that. A teacher blackout assumes the teacher's
+        placement literals in that slot false.
+        """
+        literals = {}
+        for (s, pool), blocked in self.blackout_limits().items():
+            key = (s, pool, blocked)
+            if key not in self.blackout_literals:
+                self.blackout_literals[key] = self.model.NewBoolVar(f"blackout_{s}_{pool}_{blocked}")
+                self._add_blackout(s, pool, blocked, [self.blackout_literals[key]])
+            literal = self.blackout_literals[key]
+            literals[literal.Index()] = literal
+        for t, s in self.teacher_blackouts():
+            for var in self.store.teacher_slot_vars(t, s):
+                literals[var.Not().Index()] = var.Not()
+        for locked in self.input.locked_assignments:
+            var = self._locked_var(locked)
+            if var is not None:
+                literals[var.Index()] = var
+        locked = {self.store.offering_index.get(a['offering_id']) for a in self.input.locked_assignments}
+        for offerings, literal in self.symmetry_literals:
+            if not offerings & locked:
+                literals[literal.Index()] = literal
+        return list(literals.values())
+    
+    def _screening_output(self, screening: dict) -> SolverOutput:
+        """An empty timetable with one skipped entry per screening error"""
+        logger.info(f"Screening rejected input with {len(screening['errors'])} errors")
+        skipped = [{
+            'offering_id': error['id'] if error['entity'] == 'offering' else 'all',
+            'kind': error['kind'],
+            'reason': f"Screening ({error['entity']} {error['id']}): {error['reason']}",
+        } for error in screening['errors']]
+        return SolverOutput(
+            assignments=[],
+            objective=float('inf'),
+            penalties={'teacher_prefs': 0, 'max_per_day': 0, 'max_per_week': 0, 'gaps': 0, 'spread': 0,
+                       'stability': 0},
+            skipped=skipped,
+            stats={
+                'screening': screening,
+                'solver_options': self.options,
+                'timings': dict(self.timings, total=round(sum(self.timings.values()), 4)),
+                'search': {'status': 'SCREENED_INFEASIBLE'},
+            },
+        )
+    
+    def _build_output(self, solver: cp_model.CpSolver, status) -> SolverOutput:
+        if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+            return self._solution(solver.Value, solver.ObjectiveValue())
         else:
             return SolverOutput(
                 assignments=[],
                 objective=float('inf'),
-                penalties={'teacher_prefs': 0, 'max_per_day': 0, 'max_per_week': 0, 'gaps': 0, 'spread': 0},
+                penalties={'teacher_prefs': 0, 'max_per_day': 0, 'max_per_week': 0, 'gaps': 0, 'spread': 0,
+                           'stability': 0},
                 skipped=[{
                     'offering_id': 'all',
                     'kind': 'all',
                     'reason': f'Solver status: {solver.StatusName(status)}'
                 }]
-            )
\ No newline at end of file
+            )
+    
+    def _solution(self, value: Callable, objective: float) -> SolverOutput:
+        """Timetable, skipped sessions and penalty breakdown of one solution"""
+        assignments = self._extract_assignments(value)
+        skipped = []
+        
+        # Preserve locked assignments
+        for locked in self.input.locked_assignments:
+            # Remove any conflicting assignment
+            assignments = [a for a in assignments if not (
+                a['offering_id'] == locked['offering_id'] and
+                a['kind'] == locked['kind'] and
+                a['slot_id'] == locked['slot_id']
+            )]
+            assignments.append(locked)
+        
+        # Check for skipped items
+        for offering in self.input.offerings:
+            course = offering['course']
+            offering_id = offering['id']
+            
+            for kind, required in [('L', course['L']), ('T', course['T']), ('P', course['P'])]:
+                if required > 0:
+                    scheduled = len([a for a in assignments if 
+                                   a['offering_id'] == offering_id and a['kind'] == kind])
+                    if scheduled < required:
+                        skipped.append({
+                            'offering_id': offering_id,
+                            'kind': kind,
+                            'reason': f"Could only schedule {scheduled}/{required} {kind} sessions"
+                        })
+        
+        # Calculate penalty breakdown
+        penalties = {name: int(value(terms.expr())) for name, terms in self.penalty_components.items()}
+        
+        return SolverOutput(
+            assignments=assignments,
+            objective=objective,
+            penalties=penalties,
+            skipped=skipped
+        )
+
+
+def create_solver(input_data: SolverInput, fixed_assignments: Optional[List[dict]] = None) -> TimetableSolver:
+    """The engine selected by solver_options.formulation"""
+    formulation = resolve_options(input_data.solver_options)['formulation']
+    if formulation == 'two_stage':
+        from two_stage import TwoStageSolver
+        return TwoStageSolver(input_data, fixed_assignments)
+    if formulation == 'compact':
+        from compact import CompactSolver
+        return CompactSolver(input_data, fixed_assignments)
+    return TimetableSolver(input_data, fixed_assignments)
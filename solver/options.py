@@ -0,0 +1,181 @@
+"""CP-SAT search parameters: named presets, deployment defaults and per-request overrides"""
+
+import functools
+import logging
+import os
+from typing import Literal, Optional
+
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+PRESETS = {
+    'fast': {'time_limit': 5.0, 'relative_gap_limit': 0.05, 'stall_time': 2.0},
+    'balanced': {'time_limit': 30.0, 'relative_gap_limit': 0.01, 'stall_time': 10.0},
+    'thorough': {'time_limit': 120.0, 'relative_gap_limit': 0.0, 'stall_time': 60.0},
+}
+
+# Adaptive budget as a share of time_limit: for any solve, per model variable and
+# per offering, clamped between MIN_TIME_LIMIT seconds and the hard time limit
+ADAPTIVE_BUDGET = {'base': 0.1, 'per_variable': 0.00003, 'per_offering': 0.0015}
+MIN_TIME_LIMIT = 1.0
+
+
+class SolverOptions(BaseModel):
+    """Per-request search parameters; anything left unset uses the deployment default"""
+    preset: Optional[Literal['fast', 'balanced', 'thorough']] = None
+    time_limit: Optional[float] = Field(None, gt=0)
+    # 'adaptive' stops, once a solution exists, after a share of time_limit scaled with the
+    # built model's size, and at time_limit regardless; an explicit time_limit (request or
+    # SOLVER_TIME_LIMIT) makes it 'fixed'
+    time_budget: Optional[Literal['fixed', 'adaptive']] = None
+    # Lets an adaptive budget run past time_limit, up to this, on large models
+    max_time_limit: Optional[float] = Field(None, gt=0)
+    # Stop once the objective has not improved for this many seconds (0 never stops)
+    stall_time: Optional[float] = Field(None, ge=0)
+    num_workers: Optional[int] = Field(None, ge=1)
+    random_seed: Optional[int] = None
+    relative_gap_limit: Optional[float] = Field(None, ge=0)
+    linearization_level: Optional[int] = Field(None, ge=0, le=2)
+    # 'rooms' decides slot and room together; 'two_stage' decides slots, then matches rooms;
+    # 'compact' gives each session an integer slot and room-class variable
+    formulation: Optional[Literal['rooms', 'two_stage', 'compact']] = None
+    # Reject inputs that fail the counting checks in screening.py before building the model
+    screening: Optional[bool] = None
+    # Model rooms of equal kind and capacity as one counted pool
+    room_pools: Optional[bool] = None
+    # Order the timetables of sections with identical offerings
+    symmetry_breaking: Optional[bool] = None
+    # Hint CP-SAT with a greedy ConstraintSolver timetable (repaired if infeasible)
+    greedy_hint: Optional[bool] = None
+    # Keep the built model per dataset version and apply locks and blackouts as assumptions
+    compiled_models: Optional[bool] = None
+    # Also return this many other timetables, each at least min_distance placements away from
+    # the rest; follow-up searches for missing ones get alternative_time_limit seconds each
+    alternatives: Optional[int] = Field(None, ge=0, le=10)
+    min_distance: Optional[int] = Field(None, ge=1)
+    alternative_time_limit: Optional[float] = Field(None, gt=0)
+
+
+def available_cores() -> int:
+    """CPU cores this process may run on, which respects container CPU pinning"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def pool_size() -> int:
+    """Solves the JobManager runs side by side: SOLVER_WORKERS, else one per core.
+
+    The two tuning knobs: SOLVER_WORKERS sizes the process pool, and
+    SOLVER_NUM_WORKERS fixes the CP-SAT workers of every solve. Without the
+    latter a pooled solve gets the cores divided by the solves running with
+    it (see jobs.JobManager), so a lone /solve searches on all of them.
+    """
+    return int(os.getenv('SOLVER_WORKERS', '0')) or available_cores()
+
+
+def shared_workers(active: int, pool: int) -> int:
+    """CP-SAT workers for one of `active` solves running at once on a pool of `pool` processes"""
+    return max(1, available_cores() // max(1, min(active, pool)))
+
+
+def default_preset() -> str:
+    """SOLVER_PRESET, or 'balanced' when it is unset or names no preset"""
+    name = os.getenv('SOLVER_PRESET', 'balanced')
+    if name not in PRESETS:
+        _warn_unknown_preset(name)
+        return 'balanced'
+    return name
+
+
+@functools.lru_cache(maxsize=None)
+def _warn_unknown_preset(name: str):
+    logger.warning(f"Unknown SOLVER_PRESET {name!r}; using 'balanced' (choose from {sorted(PRESETS)})")
+
+
+def _flag(value: str) -> bool:
+    return value.lower() not in ('0', 'false', 'no')
+
+
+def deployment_defaults() -> dict:
+    """SOLVER_PRESET, then SOLVER_TIME_LIMIT, SOLVER_NUM_WORKERS, SOLVER_RANDOM_SEED,
+    SOLVER_RELATIVE_GAP, SOLVER_LINEARIZATION_LEVEL, SOLVER_TIME_BUDGET, SOLVER_MAX_TIME_LIMIT,
+    SOLVER_STALL_TIME, SOLVER_FORMULATION, SOLVER_SCREENING, SOLVER_ROOM_POOLS,
+    SOLVER_SYMMETRY_BREAKING, SOLVER_GREEDY_HINT, SOLVER_COMPILED_MODELS, SOLVER_MIN_DISTANCE and
+    SOLVER_ALTERNATIVE_TIME_LIMIT from the environment"""
+    defaults = dict(PRESETS[default_preset()])
+    defaults['num_workers'] = available_cores()
+    defaults['random_seed'] = 0
+    defaults['screening'] = True
+    defaults['room_pools'] = True
+    defaults['symmetry_breaking'] = True
+    defaults['greedy_hint'] = False
+    defaults['compiled_models'] = True
+    defaults['formulation'] = 'rooms'
+    defaults['time_budget'] = 'adaptive'
+    defaults['alternatives'] = 0
+    defaults['min_distance'] = 3
+    defaults['alternative_time_limit'] = 10.0
+
+    for key, env, cast in [
+        ('time_limit', 'SOLVER_TIME_LIMIT', float),
+        ('num_workers', 'SOLVER_NUM_WORKERS', int),
+        ('random_seed', 'SOLVER_RANDOM_SEED', int),
+        ('relative_gap_limit', 'SOLVER_RELATIVE_GAP', float),
+        ('linearization_level', 'SOLVER_LINEARIZATION_LEVEL', int),
+        ('time_budget', 'SOLVER_TIME_BUDGET', str),
+        ('max_time_limit', 'SOLVER_MAX_TIME_LIMIT', float),
+        ('stall_time', 'SOLVER_STALL_TIME', float),
+        ('formulation', 'SOLVER_FORMULATION', str),
+        ('screening', 'SOLVER_SCREENING', _flag),
+        ('room_pools', 'SOLVER_ROOM_POOLS', _flag),
+        ('symmetry_breaking', 'SOLVER_SYMMETRY_BREAKING', _flag),
+        ('greedy_hint', 'SOLVER_GREEDY_HINT', _flag),
+        ('compiled_models', 'SOLVER_COMPILED_MODELS', _flag),
+        ('min_distance', 'SOLVER_MIN_DISTANCE', int),
+        ('alternative_time_limit', 'SOLVER_ALTERNATIVE_TIME_LIMIT', float),
+    ]:
+        if os.getenv(env):
+            defaults[key] = cast(os.getenv(env))
+    return defaults
+
+
+def resolve_options(options: SolverOptions) -> dict:
+    """Effective parameters: deployment defaults, then the request preset, then explicit fields"""
+    effective = deployment_defaults()
+    if options.preset:
+        effective.update(PRESETS[options.preset])
+    effective['preset'] = options.preset or default_preset()
+
+    explicit = options.model_dump(exclude={'preset'}, exclude_none=True)
+    effective.update(explicit)
+    if ('time_limit' in explicit or os.getenv('SOLVER_TIME_LIMIT')) and 'time_budget' not in explicit:
+        effective['time_budget'] = 'fixed'
+    return effective
+
+
+def hard_time_limit(effective: dict) -> float:
+    """Longest a search may run: time_limit, or a larger max_time_limit under an adaptive budget"""
+    if effective['time_budget'] == 'adaptive' and effective.get('max_time_limit'):
+        return max(effective['time_limit'], effective['max_time_limit'])
+    return effective['time_limit']
+
+
+def adaptive_time_limit(effective: dict, variables: int, offerings: int) -> float:
+    """Search budget for a model of this size under the effective options"""
+    share = (ADAPTIVE_BUDGET['base'] + ADAPTIVE_BUDGET['per_variable'] * variables +
+             ADAPTIVE_BUDGET['per_offering'] * offerings)
+    return round(min(max(share * effective['time_limit'], MIN_TIME_LIMIT), hard_time_limit(effective)), 1)
+
+
+def apply_options(parameters, effective: dict):
+    """Copy effective options onto a CpSolver's SatParameters"""
+    parameters.max_time_in_seconds = effective['time_limit']
+    parameters.num_workers = effective['num_workers']
+    parameters.random_seed = effective['random_seed']
+    parameters.relative_gap_limit = effective['relative_gap_limit']
+    if effective.get('linearization_level') is not None:
+        # 0 skips the LP relaxation, which can help a single worker find a first solution
+        parameters.linearization_level = effective['linearization_level']
@@ -0,0 +1,76 @@
+"""Portfolio solving: race every engine on one input and keep the best-scored timetable"""
+
+import time
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+from evaluation import evaluate_penalties
+
+HEURISTICS = ('greedy', 'simple')
+ENGINES = ('cp-sat',) + HEURISTICS
+
+
+def heuristic_data(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """SolverInput payload in the shape ConstraintSolver and SimpleSolver read"""
+    offerings = [dict(o, teacher_id=o.get('teacher_id') or (o.get('teacher') or {}).get('id'))
+                 for o in payload['offerings']]
+    return {
+        'teachers': payload['teachers'],
+        'rooms': payload['rooms'],
+        'slots': payload['slots'],
+        'offerings': offerings,
+        'availability': payload['availability'],
+        'locked_assignments': payload.get('locked_assignments', []),
+    }
+
+
+def unscheduled(data: Dict[str, Any], assignments: List[dict]) -> List[Tuple[str, str, int, int]]:
+    """(offering, kind, scheduled, required) for every session kind short of its hours"""
+    scheduled = Counter((a['offering_id'], a['kind']) for a in assignments)
+    missing = []
+    for offering in data['offerings']:
+        course = offering['course']
+        for kind in ('L', 'T', 'P'):
+            if course[kind] > 0 and scheduled[(offering['id'], kind)] < course[kind]:
+                missing.append((offering['id'], kind, scheduled[(offering['id'], kind)], course[kind]))
+    return missing
+
+
+def run_heuristic(engine: str, payload: Dict[str, Any]) -> dict:
+    """Run ConstraintSolver ('greedy') or SimpleSolver ('simple') on a SolverInput
+    payload as a SolverOutput dict; runs inside a worker process"""
+    start = time.perf_counter()
+    if engine == 'greedy':
+        from advanced_solver import ConstraintSolver as Engine
+    else:
+        from simple_solver import SimpleSolver as Engine
+    assignments = Engine(heuristic_data(payload)).solve()['assignments']
+    evaluation = evaluate_penalties(payload, assignments)
+    return {
+        'assignments': assignments,
+        'objective': evaluation['total'],
+        'penalties': evaluation['penalties'],
+        'skipped': [{
+            'offering_id': offering_id,
+            'kind': kind,
+            'reason': f"Could only schedule {done}/{required} {kind} sessions"
+        } for offering_id, kind, done, required in unscheduled(payload, assignments)],
+        'stats': {'engine': engine, 'timings': {'total': round(time.perf_counter() - start, 4)}},
+    }
+
+
+def score(payload: Dict[str, Any], output: dict) -> dict:
+    """Hard violations, missing sessions and evaluated penalty, on one scale for every engine"""
+    evaluation = evaluate_penalties(payload, output['assignments'])
+    return {
+        'hard_violations': evaluation['hard_violations'],
+        'missing_sessions': sum(required - done for _, _, done, required
+                                in unscheduled(payload, output['assignments'])),
+        'penalty': evaluation['total'],
+    }
+
+
+def rank(summary: dict) -> Tuple[int, int]:
+    """Sort key, best first: a double-booked session has to move, so it counts
+    as much as a missing one, and the penalty only breaks ties"""
+    return summary['hard_violations'] + summary['missing_sessions'], summary['penalty']
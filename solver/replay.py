@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Replay a solver dump (see dumps.py) with other parameters or engines and print phase timings.
+
+The 'proto' engine re-solves the dumped CpModelProto as it was, with its
+hints and assumptions; the formulation engines rebuild the model from the
+dumped SolverInput, so their timings include the build phases.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+from ortools.sat.python import cp_model
+
+from dumps import load_model, read_dump
+
+ENGINES = ['proto', 'rooms', 'two_stage', 'compact']
+# solver_options the command line can override, with their types
+OVERRIDES = {
+    'time_limit': float,
+    'num_workers': int,
+    'random_seed': int,
+    'relative_gap_limit': float,
+    'linearization_level': int,
+}
+
+
+def replay_proto(proto, meta: Dict[str, Any], overrides: Dict[str, Any], params: List[str]) -> Dict[str, Any]:
+    """Solve the dumped model with its recorded parameters, then overrides and raw SatParameters"""
+    solver = cp_model.CpSolver()
+    solver.parameters.parse_text_format(meta.get('parameters', ''))
+    for key, value in overrides.items():
+        setattr(solver.parameters, 'max_time_in_seconds' if key == 'time_limit' else key, value)
+    if params:
+        solver.parameters.merge_text_format(' '.join(params))
+
+    model = load_model(proto)
+    start = time.perf_counter()
+    status = solver.Solve(model)
+    objective = solver.ObjectiveValue() if status in (cp_model.OPTIMAL, cp_model.FEASIBLE) else None
+    return {
+        'status': solver.StatusName(status),
+        'objective': objective,
+        'best_bound': solver.BestObjectiveBound(),
+        'timings': {'search': round(time.perf_counter() - start, 4)},
+        'conflicts': solver.NumConflicts(),
+        'branches': solver.NumBranches(),
+    }
+
+
+def replay_engine(engine: str, data: Dict[str, Any], meta: Dict[str, Any],
+                  overrides: Dict[str, Any]) -> Dict[str, Any]:
+    """Rebuild and solve the dumped input with the given formulation"""
+    from model import SolverInput, create_solver
+    options = dict(data.get('solver_options') or {}, formulation=engine, **overrides)
+    solver = create_solver(SolverInput(**dict(data, solver_options=options)), meta.get('fixed_assignments'))
+    output = solver.solve()
+    search = output.stats.get('search', {})
+    return {
+        'status': search.get('status'),
+        'objective': output.objective,
+        'best_bound': search.get('best_bound'),
+        'timings': output.stats.get('timings', {}),
+        'conflicts': search.get('conflicts'),
+        'branches': search.get('branches'),
+    }
+
+
+def format_runs(meta: Dict[str, Any], runs: List[Dict[str, Any]]) -> List[str]:
+    """The recorded solve, then one line per replay, with one column per phase"""
+    recorded = {
+        'engine': f"dump:{meta.get('engine')}",
+        'status': (meta.get('search') or {}).get('status'),
+        'objective': meta.get('objective'),
+        'timings': meta.get('timings') or {},
+    }
+    rows = [recorded] + runs
+    phases = []
+    for row in rows:
+        phases.extend(phase for phase in row['timings'] if phase not in phases and phase != 'total')
+    phases.append('total')
+    lines = [f"{'engine':>22} {'status':>10} {'objective':>10} " + ' '.join(f"{p[:12]:>12}" for p in phases)]
+    for row in rows:
+        timings = row['timings']
+        total = timings.get('total', sum(timings.values()))
+        cells = [timings.get(p) if p != 'total' else round(total, 4) for p in phases]
+        lines.append(f"{row['engine']:>22} {str(row['status']):>10} {str(row['objective']):>10} " +
+                     ' '.join(f"{'' if c is None else c:>12}" for c in cells))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('dump', help='Dump directory written under SOLVER_DUMP_DIR')
+    parser.add_argument('--engines', default='proto', help=f"Comma-separated, from {ENGINES}")
+    for key, cast in OVERRIDES.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=cast)
+    parser.add_argument('--param', action='append', default=[],
+                        help="Raw SatParameters field for the proto engine, e.g. 'search_branching:FIXED_SEARCH'")
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dump):
+        parser.error(f"{args.dump} is not a directory")
+    engines = args.engines.split(',')
+    unknown = [e for e in engines if e not in ENGINES]
+    if unknown:
+        parser.error(f"unknown engines {unknown}; choose from {ENGINES}")
+    overrides = {key: getattr(args, key) for key in OVERRIDES if getattr(args, key) is not None}
+
+    # Replays are not dumped again
+    os.environ.pop('SOLVER_DUMP_DIR', None)
+    data, proto, meta = read_dump(args.dump)
+    runs = []
+    for engine in engines:
+        print(f"{engine:>10} ...", end='', file=sys.stderr, flush=True)
+        if engine == 'proto':
+            result = replay_proto(proto, meta, overrides, args.param)
+        else:
+            result = replay_engine(engine, data, meta, overrides)
+        print(f" {result['status']}", file=sys.stderr)
+        runs.append({'engine': engine, **result})
+
+    if args.json:
+        print(json.dumps({'dump': args.dump, 'recorded': meta, 'runs': runs}, indent=2, default=str))
+    else:
+        print('\n'.join(format_runs(meta, runs)))
+
+
+if __name__ == '__main__':
+    main()
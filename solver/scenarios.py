@@ -0,0 +1,89 @@
+"""What-if scenarios: variants of a base SolverInput, solved side by side and compared"""
+
+import math
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+from model import SolverInput
+from options import SolverOptions
+
+MAX_SCENARIOS = 50
+
+
+class Scenario(BaseModel):
+    """A variant of the base input. Only blackouts and locks keep the base's
+    compiled model (see compiled.py); other solver_options may need a build.
+    A base with current_assignments and a stability_weight keeps every
+    variant close to that timetable, so the changes reflect the delta."""
+    name: str
+    # Added to the base input's: e.g. {'room_id', 'slot_id'} for a closed room,
+    # {'teacher_id', 'slot_id'} for a teacher who drops a slot
+    blackouts: List[dict] = []
+    locked_assignments: List[dict] = []
+    # Fields set here replace the base's
+    solver_options: SolverOptions = SolverOptions()
+
+
+class ScenarioInput(BaseModel):
+    base: SolverInput
+    scenarios: List[Scenario] = Field(..., min_length=1, max_length=MAX_SCENARIOS)
+
+
+def scenario_input(base: SolverInput, scenario: Scenario) -> SolverInput:
+    """The base input with a scenario's deltas applied"""
+    data = base.model_dump()
+    data['blackouts'] = data['blackouts'] + scenario.blackouts
+    data['locked_assignments'] = data['locked_assignments'] + scenario.locked_assignments
+    data['solver_options'] = dict(data['solver_options'], **scenario.solver_options.model_dump(exclude_none=True))
+    return SolverInput(**data)
+
+
+def _key(assignment: dict) -> tuple:
+    return assignment['offering_id'], assignment['slot_id'], assignment['room_id'], assignment['kind']
+
+
+def _objective(output: dict) -> Optional[float]:
+    return output['objective'] if math.isfinite(output['objective']) else None
+
+
+def summarize(name: str, output: dict, base: Optional[dict] = None) -> dict:
+    """One comparison row; against the base, with the objective change and the
+    assignments the scenario adds and removes"""
+    stats = output.get('stats', {})
+    row = {
+        'name': name,
+        'status': stats.get('search', {}).get('status'),
+        'objective': _objective(output),
+        'penalties': output['penalties'],
+        'assignments': len(output['assignments']),
+        'skipped': len(output['skipped']),
+        'skipped_sessions': output['skipped'],
+        'solve_time': stats.get('timings', {}).get('total'),
+        'model_reused': stats.get('compiled', {}).get('reused', False),
+    }
+    if base is not None:
+        before = {_key(a): a for a in base['assignments']}
+        after = {_key(a): a for a in output['assignments']}
+        row['objective_delta'] = row['objective'] - _objective(base) \
+            if row['objective'] is not None and _objective(base) is not None else None
+        row['skipped_delta'] = len(output['skipped']) - len(base['skipped'])
+        row['added'] = [a for key, a in after.items() if key not in before]
+        row['removed'] = [a for key, a in before.items() if key not in after]
+        row['changed'] = len(row['removed'])
+    return row
+
+
+def compare(scenarios: List[Scenario], base: dict, outputs: List[dict]) -> dict:
+    """Comparison table: the base row, then one row per scenario, in request order"""
+    rows = [summarize(scenario.name, output, base) for scenario, output in zip(scenarios, outputs)]
+    solves = [base] + outputs
+    return {
+        'base': summarize('base', base),
+        'scenarios': rows,
+        'stats': {
+            'solves': len(solves),
+            'model_builds': sum(1 for output in solves
+                                if not output.get('stats', {}).get('compiled', {}).get('reused', False)),
+        },
+    }
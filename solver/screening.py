@@ -0,0 +1,165 @@
+"""Linear-time feasibility screening run before the CP-SAT model is built"""
+
+import time
+from collections import defaultdict
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    from model import SolverInput
+
+
+def _issue(entity: str, entity_id: str, check: str, reason: str,
+           required: Optional[int] = None, available: Optional[int] = None,
+           kind: str = 'all') -> dict:
+    return {
+        'entity': entity, 'id': entity_id, 'check': check, 'kind': kind,
+        'reason': reason, 'required': required, 'available': available,
+    }
+
+
+def screen(input_data: 'SolverInput') -> dict:
+    """Check counting bounds that any timetable must satisfy.
+
+    Errors are conditions under which TimetableSolver's hard constraints
+    cannot all hold, so the model would be INFEASIBLE. Warnings are sessions
+    that have no candidate placement at all (TimetableSolver skips them) or
+    soft limits that will certainly be exceeded. Locked lectures and
+    tutorials may sit outside a teacher's availability, so they are counted
+    as extra capacity rather than checked.
+    """
+    start = time.perf_counter()
+    errors: List[dict] = []
+    warnings: List[dict] = []
+
+    theory_slots = [s['id'] for s in input_data.slots if not s['is_lab']]
+    clusters = {s['cluster'] for s in input_data.slots if s['cluster']}
+    class_capacities = sorted((r['capacity'] for r in input_data.rooms if r['kind'] == 'CLASS'), reverse=True)
+    lab_rooms = sum(1 for r in input_data.rooms if r['kind'] == 'LAB')
+    largest_class = class_capacities[0] if class_capacities else 0
+    largest_lab = max((r['capacity'] for r in input_data.rooms if r['kind'] == 'LAB'), default=0)
+
+    teacher_slots = defaultdict(int)
+    theory_slot_set = set(theory_slots)
+    for avail in input_data.availability:
+        if avail['can_teach'] and avail['slot_id'] in theory_slot_set:
+            teacher_slots[avail['teacher_id']] += 1
+
+    locked = defaultdict(int)
+    for assignment in input_data.locked_assignments:
+        if assignment.get('kind') in ('L', 'T'):
+            locked[assignment['offering_id']] += 1
+
+    teacher_locked = defaultdict(int)
+    teacher_hours = defaultdict(int)
+    teacher_labs = defaultdict(int)
+    section_hours = defaultdict(int)
+    section_labs = defaultdict(int)
+    hours_by_size = []  # (expected_size, theory hours) of schedulable offerings
+    lab_offerings = 0
+
+    # Offerings: can each session be placed somewhere at all?
+    for offering in input_data.offerings:
+        course = offering['course']
+        theory = course['L'] + course['T']
+        teacher_id = offering['teacher']['id'] if offering['teacher'] else None
+        section_id = offering['section']['id']
+        expected_size = offering.get('expected_size', 60)
+
+        if theory > 0:
+            available = teacher_slots[teacher_id] if teacher_id else len(theory_slots)
+            available += locked[offering['id']]
+            if expected_size > largest_class and not locked[offering['id']]:
+                warnings.append(_issue('offering', offering['id'], 'room_capacity',
+                                       f"Expected size {expected_size} exceeds the largest classroom "
+                                       f"({largest_class}); lectures and tutorials will be skipped",
+                                       expected_size, largest_class))
+            elif available == 0:
+                warnings.append(_issue('offering', offering['id'], 'teacher_availability',
+                                       "Teacher has no available non-lab slots; lectures and tutorials "
+                                       "will be skipped", theory, 0))
+            else:
+                if available < theory:
+                    errors.append(_issue('offering', offering['id'], 'teacher_availability',
+                                         f"Needs {theory} lecture/tutorial slots but the teacher is "
+                                         f"available in only {available}", theory, available))
+                if teacher_id:
+                    teacher_hours[teacher_id] += theory
+                    teacher_locked[teacher_id] += locked[offering['id']]
+                section_hours[section_id] += theory
+                hours_by_size.append((expected_size, max(0, theory - locked[offering['id']])))
+
+        if course['P'] > 0:
+            if not clusters or lab_rooms == 0:
+                warnings.append(_issue('offering', offering['id'], 'lab_rooms',
+                                       "No lab clusters or lab rooms exist; practicals will be skipped",
+                                       1, 0, kind='P'))
+            else:
+                lab_offerings += 1
+                section_labs[section_id] += 1
+                if teacher_id:
+                    teacher_labs[teacher_id] += 1
+                if expected_size > largest_lab:
+                    warnings.append(_issue('offering', offering['id'], 'lab_capacity',
+                                           f"Expected size {expected_size} exceeds the largest lab "
+                                           f"({largest_lab})", expected_size, largest_lab, kind='P'))
+
+    # Teachers: one session per slot, one lab per cluster
+    teachers = {t['id']: t for t in input_data.teachers}
+    for teacher_id, hours in teacher_hours.items():
+        available = teacher_slots[teacher_id] + teacher_locked[teacher_id]
+        if hours > available:
+            errors.append(_issue('teacher', teacher_id, 'teacher_availability',
+                                 f"Teaches {hours} lecture/tutorial hours but is available in only "
+                                 f"{available} non-lab slots", hours, available))
+        max_per_week = teachers.get(teacher_id, {}).get('max_per_week', 12)
+        if hours > max_per_week:
+            warnings.append(_issue('teacher', teacher_id, 'max_per_week',
+                                   f"Teaches {hours} hours, over the weekly limit of {max_per_week}",
+                                   hours, max_per_week))
+    for teacher_id, labs in teacher_labs.items():
+        if labs > len(clusters):
+            errors.append(_issue('teacher', teacher_id, 'lab_clusters',
+                                 f"Teaches {labs} labs but only {len(clusters)} lab clusters exist",
+                                 labs, len(clusters), kind='P'))
+
+    # Sections: one session per slot, one lab per cluster
+    for section_id, hours in section_hours.items():
+        if hours > len(theory_slots):
+            errors.append(_issue('section', section_id, 'slot_grid',
+                                 f"Needs {hours} lecture/tutorial hours but only {len(theory_slots)} "
+                                 f"non-lab slots exist", hours, len(theory_slots)))
+    for section_id, labs in section_labs.items():
+        if labs > len(clusters):
+            errors.append(_issue('section', section_id, 'lab_clusters',
+                                 f"Needs {labs} labs but only {len(clusters)} lab clusters exist",
+                                 labs, len(clusters), kind='P'))
+
+    # Rooms: hours needing at least capacity c must fit in slots x rooms of capacity >= c
+    hours_by_size.sort(reverse=True)
+    demand = 0
+    i = 0
+    for rooms_fitting, capacity in enumerate(class_capacities, start=1):
+        next_capacity = class_capacities[rooms_fitting] if rooms_fitting < len(class_capacities) else 0
+        while i < len(hours_by_size) and hours_by_size[i][0] > next_capacity:
+            demand += hours_by_size[i][1]
+            i += 1
+        supply = rooms_fitting * len(theory_slots)
+        if demand > supply:
+            errors.append(_issue('rooms', f"capacity>={capacity}", 'room_capacity',
+                                 f"{demand} lecture/tutorial hours need rooms of capacity {capacity} or more, "
+                                 f"but {rooms_fitting} such rooms x {len(theory_slots)} slots give {supply}",
+                                 demand, supply))
+            break
+
+    lab_supply = len(clusters) * lab_rooms
+    if lab_offerings > lab_supply:
+        errors.append(_issue('rooms', 'LAB', 'lab_clusters',
+                             f"{lab_offerings} lab offerings but {len(clusters)} clusters x {lab_rooms} "
+                             f"lab rooms give {lab_supply} placements", lab_offerings, lab_supply, kind='P'))
+
+    return {
+        'feasible': not errors,
+        'errors': errors,
+        'warnings': warnings,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 3),
+    }
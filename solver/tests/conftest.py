@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+# The solver modules import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def make_input():
+    """Builds a small SolverInput: offerings as (section, teacher, L, P, expected_size),
+    rooms as (id, kind, capacity), on a week of lecture slots plus two lab clusters"""
+    from model import SolverInput
+
+    def build(offerings, rooms, **fields):
+        slots = [{'id': f"{day}-{hour}", 'code': f"{day}{hour}", 'occ': 1, 'day': day,
+                  'start_time': f"{hour:02d}:00", 'end_time': f"{hour:02d}:55", 'cluster': None, 'is_lab': False}
+                 for day in ('MON', 'TUE', 'WED') for hour in (9, 10, 11)]
+        slots += [{'id': f"LAB{c}-{hour}", 'code': f"L{c}{hour}", 'occ': 1, 'day': 'THU',
+                   'start_time': f"{hour:02d}:00", 'end_time': f"{hour:02d}:55", 'cluster': f"LAB{c}", 'is_lab': True}
+                  for c, hours in ((1, (9, 10)), (2, (14, 15))) for hour in hours]
+        teachers = {}
+        items = []
+        for i, (section, teacher, lectures, practicals, size) in enumerate(offerings):
+            teachers[teacher] = {'id': teacher, 'code': teacher, 'name': teacher, 'max_per_day': 4,
+                                 'max_per_week': 15, 'prefs': {}}
+            course = {'id': f"c{i}", 'code': f"C{i}", 'name': f"Course {i}", 'L': lectures, 'T': 0, 'P': practicals}
+            items.append({'id': f"o{i}", 'course_id': course['id'], 'section_id': section, 'teacher_id': teacher,
+                          'expected_size': size, 'needs': [], 'course': course, 'teacher': teachers[teacher],
+                          'section': {'id': section, 'program': 'BSc', 'year': 1, 'name': section}})
+        data = {
+            'teachers': list(teachers.values()),
+            'rooms': [{'id': room_id, 'code': room_id, 'capacity': capacity, 'kind': kind, 'tags': []}
+                      for room_id, kind, capacity in rooms],
+            'slots': slots,
+            'offerings': items,
+            'availability': [{'teacher_id': t, 'slot_id': s['id'], 'can_teach': True} for t in teachers for s in slots],
+        }
+        data.update(fields)
+        return SolverInput(**data)
+
+    return build
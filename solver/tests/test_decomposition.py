@@ -0,0 +1,86 @@
+import asyncio
+
+import main
+from decomposition import find_components, split_input
+from jobs import run_solver
+
+# Two sections with separate teachers that compete for the same classrooms
+SHARED_ROOMS = dict(
+    offerings=[('A', 'tA', 3, 0, 50), ('A', 'tA', 3, 0, 50), ('B', 'tB', 3, 0, 50), ('B', 'tB', 3, 0, 50)],
+    rooms=[('r0', 'CLASS', 60), ('r1', 'CLASS', 60)],
+)
+
+
+def _solve_inline(monkeypatch):
+    """Route main's pool runs through run_solver in this process; returns the inputs solved"""
+    solved = []
+
+    async def run(input_data, worker=run_solver):
+        solved.append(input_data)
+        return worker(input_data.model_dump())
+
+    monkeypatch.setattr(main.job_manager, 'run', run)
+    return solved
+
+
+def test_shared_rooms_are_not_split(make_input):
+    input_data = make_input(**SHARED_ROOMS)
+    assert len(find_components(input_data)) == 1
+    assert split_input(input_data) == [input_data]
+
+
+def test_shared_rooms_solve_like_the_whole_input(monkeypatch, make_input):
+    input_data = make_input(**SHARED_ROOMS, solver_options={'time_limit': 10})
+    _solve_inline(monkeypatch)
+    result = asyncio.run(main.solve_decomposed(input_data))
+    assert result['stats']['search']['status'] in ('OPTIMAL', 'FEASIBLE')
+    assert len(result['assignments']) == 12 and not result['skipped']
+
+
+def test_disjoint_rooms_are_split(monkeypatch, make_input):
+    input_data = make_input(offerings=[('A', 'tA', 2, 0, 50), ('B', 'tB', 0, 1, 20)],
+                            rooms=[('r0', 'CLASS', 60), ('lab0', 'LAB', 30)], solver_options={'time_limit': 10})
+    parts = split_input(input_data)
+    assert [[r['id'] for r in part.rooms] for part in parts] == [['r0'], ['lab0']]
+
+    solved = _solve_inline(monkeypatch)
+    result = asyncio.run(main.solve_decomposed(input_data))
+    assert len(solved) == 2 and result['stats']['decomposition'] == {'components': 2}
+    assert not result['skipped']
+
+
+def test_failed_component_falls_back_to_whole_input(monkeypatch, make_input):
+    # Section A's teacher cannot teach at all, so its component skips its lectures
+    input_data = make_input(offerings=[('A', 'tA', 2, 0, 50), ('B', 'tB', 0, 1, 20)],
+                            rooms=[('r0', 'CLASS', 60), ('lab0', 'LAB', 30)], solver_options={'time_limit': 10})
+    input_data = input_data.model_copy(update={'availability': [
+        dict(a, can_teach=a['teacher_id'] != 'tA') for a in input_data.availability]})
+    solved = _solve_inline(monkeypatch)
+    asyncio.run(main.solve_decomposed(input_data))
+    assert len(solved) == 3 and solved[-1] is input_data
+
+
+def test_room_wide_blackout(monkeypatch, make_input):
+    input_data = make_input(**SHARED_ROOMS, blackouts=[{'room_id': 'r1'}], solver_options={'time_limit': 10})
+    _solve_inline(monkeypatch)
+    result = asyncio.run(main.solve_decomposed(input_data))
+    assert all(a['room_id'] == 'r0' for a in result['assignments'])
+
+
+def test_room_wide_blackout_on_split_input(make_input):
+    input_data = make_input(offerings=[('A', 'tA', 2, 0, 50), ('B', 'tB', 0, 1, 20)],
+                            rooms=[('r0', 'CLASS', 60), ('r1', 'CLASS', 60), ('lab0', 'LAB', 30)],
+                            blackouts=[{'room_id': 'r1'}])
+    parts = split_input(input_data)
+    assert len(parts) == 2 and all(part.blackouts == [{'room_id': 'r1'}] for part in parts)
+
+
+def test_alternatives_solve_the_whole_input(monkeypatch, make_input):
+    input_data = make_input(offerings=[('A', 'tA', 2, 0, 50), ('B', 'tB', 0, 1, 20)],
+                            rooms=[('r0', 'CLASS', 60), ('lab0', 'LAB', 30)],
+                            solver_options={'time_limit': 10, 'alternatives': 2, 'min_distance': 1})
+    assert split_input(input_data) == [input_data]
+
+    solved = _solve_inline(monkeypatch)
+    result = asyncio.run(main.solve_decomposed(input_data))
+    assert solved == [input_data] and result['alternatives']
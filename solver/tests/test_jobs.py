@@ -0,0 +1,50 @@
+from concurrent.futures import Future
+
+import options
+from jobs import JobManager, MemoryJobStore
+
+
+class _Executor:
+    """Holds submitted solves without running them"""
+
+    def __init__(self):
+        self.payloads = []
+        self.futures = []
+
+    def submit(self, worker, payload, *args):
+        self.payloads.append(payload)
+        self.futures.append(Future())
+        return self.futures[-1]
+
+
+def _manager(monkeypatch, cores: int = 8, pool: int = 4) -> JobManager:
+    monkeypatch.setattr(options, 'available_cores', lambda: cores)
+    monkeypatch.delenv('SOLVER_NUM_WORKERS', raising=False)
+    manager = JobManager(MemoryJobStore(), max_workers=pool)
+    manager._executor = _Executor()
+    return manager
+
+
+def _workers(manager: JobManager, solver_options: dict = None) -> int:
+    manager._submit_solve(None, {'solver_options': solver_options or {}})
+    return manager.executor.payloads[-1]['solver_options']['num_workers']
+
+
+def test_lone_solve_uses_every_core(monkeypatch):
+    assert _workers(_manager(monkeypatch)) == 8
+
+
+def test_concurrent_solves_share_the_cores(monkeypatch):
+    manager = _manager(monkeypatch)
+    assert [_workers(manager) for _ in range(5)] == [8, 4, 2, 2, 2]
+    for future in manager.executor.futures:
+        future.set_result({})
+    assert _workers(manager) == 8
+
+
+def test_configured_workers_are_kept(monkeypatch):
+    manager = _manager(monkeypatch)
+    assert _workers(manager, {'num_workers': 3}) == 3
+    monkeypatch.setenv('SOLVER_NUM_WORKERS', '2')
+    manager._submit_solve(None, {'solver_options': {}})
+    assert 'num_workers' not in manager.executor.payloads[-1]['solver_options']
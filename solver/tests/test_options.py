@@ -0,0 +1,18 @@
+import logging
+
+from options import PRESETS, SolverOptions, resolve_options
+
+
+def test_unknown_preset_falls_back_to_balanced(monkeypatch, caplog):
+    monkeypatch.setenv('SOLVER_PRESET', 'balnced')
+    with caplog.at_level(logging.WARNING, logger='options'):
+        effective = resolve_options(SolverOptions())
+        resolve_options(SolverOptions())
+    assert effective['preset'] == 'balanced'
+    assert effective['time_limit'] == PRESETS['balanced']['time_limit']
+    assert len([r for r in caplog.records if 'balnced' in r.getMessage()]) == 1
+
+
+def test_known_preset_is_used(monkeypatch):
+    monkeypatch.setenv('SOLVER_PRESET', 'fast')
+    assert resolve_options(SolverOptions())['time_limit'] == PRESETS['fast']['time_limit']
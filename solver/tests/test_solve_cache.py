@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+import main
+from cache import LRUCache
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    """Each test starts from an empty in-process cache and zeroed counters"""
+    monkeypatch.setattr(main, 'redis_client', None)
+    monkeypatch.setattr(main, 'memory_cache', LRUCache(max_entries=16, ttl=main.CACHE_TTL))
+    monkeypatch.setattr(main, 'cache_stats', {'hits': 0, 'misses': 0})
+
+
+def _output(status: str, objective: float) -> dict:
+    return {
+        'assignments': [],
+        'objective': objective,
+        'penalties': {},
+        'skipped': [],
+        'stats': {'search': {'status': status}},
+    }
+
+
+def _solve_twice(monkeypatch, input_data, output: dict) -> int:
+    calls = []
+
+    async def solve(input_data):
+        calls.append(input_data)
+        return output
+
+    monkeypatch.setattr(main, 'solve_decomposed', solve)
+    for _ in range(2):
+        asyncio.run(main.solve_cached(input_data))
+    return len(calls)
+
+
+def _input(make_input):
+    return make_input(offerings=[('A', 'tA', 2, 0, 50), ('B', 'tB', 2, 0, 40)],
+                      rooms=[('r0', 'CLASS', 60), ('r1', 'CLASS', 60)], solver_options={'time_limit': 30})
+
+
+def test_failed_solve_is_not_served_from_cache(monkeypatch, make_input):
+    assert _solve_twice(monkeypatch, _input(make_input), _output('UNKNOWN', float('inf'))) == 2
+    assert main.cache_stats == {'hits': 0, 'misses': 2}
+
+
+def test_infeasible_solve_is_not_served_from_cache(monkeypatch, make_input):
+    assert _solve_twice(monkeypatch, _input(make_input), _output('INFEASIBLE', float('inf'))) == 2
+    assert len(main.memory_cache) == 0
+
+
+def test_feasible_solve_is_served_from_cache(monkeypatch, make_input):
+    assert _solve_twice(monkeypatch, _input(make_input), _output('OPTIMAL', 0.0)) == 1
+    assert main.cache_stats == {'hits': 1, 'misses': 1}
+
+
+def test_key_ignores_entity_order(make_input):
+    input_data = _input(make_input)
+    data = input_data.model_dump()
+    reordered = dict(data, **{key: list(reversed(data[key]))
+                              for key in ('teachers', 'rooms', 'slots', 'offerings', 'availability')})
+    assert reordered['rooms'] != data['rooms']
+    assert main.get_cache_key(reordered) == main.get_cache_key(data)
+    changed = dict(data, rooms=[dict(data['rooms'][0], capacity=30)] + data['rooms'][1:])
+    assert main.get_cache_key(changed) != main.get_cache_key(data)
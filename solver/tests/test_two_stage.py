@@ -0,0 +1,12 @@
+from model import create_solver
+
+
+def test_infeasible_core_describes_slot_room_counts(make_input):
+    # Twelve lectures for nine slots of a single classroom
+    input_data = make_input(offerings=[(f"S{i}", f"t{i}", 4, 0, 50) for i in range(3)], rooms=[('r0', 'CLASS', 60)],
+                            solver_options={'time_limit': 10, 'formulation': 'two_stage', 'screening': False})
+    output = create_solver(input_data).solve()
+    descriptions = [group['description'] for group in output.stats['infeasible_core']['core']]
+    rooms = [d for d in descriptions if d.startswith('Slot ')]
+    assert rooms and all(d.endswith('at most 1 lectures and tutorials, one per classroom in use') for d in rooms)
+    assert not any(d.startswith('Rooms ') for d in descriptions)
@@ -0,0 +1,292 @@
+"""Two-stage engine: CP-SAT assigns times, per-slot min-cost matching assigns rooms"""
+
+import logging
+import time
+from typing import Callable, Dict, List, Tuple
+
+from ortools.graph.python import min_cost_flow
+from ortools.sat.python import cp_model
+
+from model import TimetableSolver, SolverOutput
+from variables import KINDS, KIND_INDEX
+
+logger = logging.getLogger(__name__)
+
+# Matching costs: capacity slack per seat, each need the room's tags miss,
+# and a room too small for the class (used only when nothing fits)
+UNMET_NEED_COST = 50
+UNDERSIZED_COST = 100_000
+# Moving a session away from its room in current_assignments
+MOVED_ROOM_COST = 20
+
+
+class TwoStageSolver(TimetableSolver):
+    """TimetableSolver with the room dimension taken out of CP-SAT.
+
+    Stage one is the usual model with X keyed by (offering, slot, kind) and
+    Y by (offering, cluster); the room slot of every key is None. Room
+    single-occupancy becomes, per slot, one counting constraint per
+    classroom capacity level: sessions that need at least that capacity
+    cannot outnumber the rooms that have it. Because the rooms a class fits
+    are nested by capacity, these counts are exactly Hall's condition, so a
+    room matching always exists. Stage two finds the cheapest one slot by
+    slot (tight capacity fit, matching needs/tags), and lab cluster by lab
+    cluster.
+    """
+
+    def __init__(self, input_data, fixed_assignments=None):
+        super().__init__(input_data, fixed_assignments)
+        self.sizes = [o.get('expected_size', 60) for o in input_data.offerings]
+        self.class_rooms = [r for r, room in enumerate(input_data.rooms) if room['kind'] == 'CLASS']
+        self.lab_rooms = [r for r, room in enumerate(input_data.rooms) if room['kind'] == 'LAB']
+        self.matching_report = {}
+
+    def create_variables(self):
+        store = self.store
+        slot_rooms = self.compute_slot_room_domains()
+        # Full (slot, room) domains are only needed to validate fixed placements
+        fixed_ids = {a['offering_id'] for a in self.fixed_assignments}
+        domains = {o: [(s, r) for s in slots for r in rooms]
+                   for o, (slots, rooms) in slot_rooms.items() if store.offering_ids[o] in fixed_ids}
+        fixed = self._fixed_placements(domains)
+
+        for o, offering in enumerate(self.input.offerings):
+            course = offering['course']
+
+            if o in fixed:
+                x_keys, y_keys = fixed[o]
+                for s, k in {(s, k) for s, _, k in x_keys}:
+                    store.add_x(o, s, None, k)
+                for c in {c for c, _ in y_keys}:
+                    store.add_y(o, c, None)
+                continue
+
+            slots, rooms = slot_rooms.get(o, ([], []))
+            for kind, count in [('L', course['L']), ('T', course['T']), ('P', course['P'])]:
+                if count <= 0:
+                    continue
+                if kind == 'P':
+                    if self.lab_rooms:
+                        for c in range(len(store.cluster_names)):
+                            store.add_y(o, c, None)
+                elif rooms:
+                    k = KIND_INDEX[kind]
+                    for s in slots:
+                        store.add_x(o, s, None, k)
+
+        # Locked lectures are honoured even outside the domain
+        for locked in self.input.locked_assignments:
+            key = self._locked_key(locked)
+            o, s, _, k = key
+            if None in (o, s, k) or key in store.x or locked['kind'] == 'P':
+                continue
+            if not self.input.slots[s]['is_lab']:
+                store.add_x(o, s, None, k)
+                self.pruning_report['locked_overrides'] += 1
+
+        self.pruning_report['created_variables'] = store.num_variables
+        logger.info(f"Created {store.num_variables} time variables (rooms assigned after search)")
+
+    def add_hard_constraints(self):
+        # Room occupancy in the base class finds no per-room variables and adds nothing
+        super().add_hard_constraints()
+        store = self.store
+
+        # Locked lectures keep their room, which no other class may take, and blacked-out rooms are unusable
+        reserved = {}
+        for s, r in self.blackout_pairs():
+            reserved.setdefault(s, set()).add(r)
+        locked_vars = set()
+        for locked in self.input.locked_assignments:
+            var = self._locked_var(locked)
+            r = store.room_index.get(locked['room_id'])
+            if var is not None and r is not None:
+                reserved.setdefault(self._locked_key(locked)[1], set()).add(r)
+                locked_vars.add(var.index)
+
+        # Capacity levels, largest first; a class of size z fits every level >= z
+        capacities = sorted({self.input.rooms[r]['capacity'] for r in self.class_rooms}, reverse=True)
+        by_slot: Dict[int, List[Tuple[int, cp_model.IntVar]]] = {}
+        for (o, s, _, _), var in store.x.items():
+            if var.index not in locked_vars:
+                by_slot.setdefault(s, []).append((self.sizes[o], var))
+
+        for s, sessions in by_slot.items():
+            guard = self._guard('rooms', store.slot_ids[s])
+            free = [r for r in self.class_rooms if r not in reserved.get(s, ())]
+            sessions.sort(key=lambda item: -item[0])
+            demand = []
+            i = 0
+            for level, capacity in enumerate(capacities):
+                lower = capacities[level + 1] if level + 1 < len(capacities) else 0
+                while i < len(sessions) and sessions[i][0] > lower:
+                    demand.append(sessions[i][1])
+                    i += 1
+                supply = sum(1 for r in free if self.input.rooms[r]['capacity'] >= capacity)
+                if len(demand) > supply:
+                    self.model.Add(cp_model.LinearExpr.sum(demand) <= supply).OnlyEnforceIf(guard)
+            # Classes too large for every room still need some room
+            demand.extend(var for _, var in sessions[i:])
+            if len(demand) > len(free):
+                self.model.Add(cp_model.LinearExpr.sum(demand) <= len(free)).OnlyEnforceIf(guard)
+
+        # One lab room per lab offering in each cluster, out of those in use for all its slots
+        for c in range(len(store.cluster_names)):
+            cluster_vars = store.y_by_cluster_room.get((c, None), [])
+            lab_rooms = self._lab_rooms(c)
+            if len(cluster_vars) > len(lab_rooms):
+                guard = self._guard('rooms', store.cluster_names[c])
+                self.model.Add(cp_model.LinearExpr.sum(cluster_vars) <= len(lab_rooms)).OnlyEnforceIf(guard)
+
+    def _lab_rooms(self, c: int) -> List[int]:
+        """Lab rooms not blacked out in any slot of cluster c"""
+        blocked = {r for s, r in self.blackout_pairs() if s in self.store.cluster_slots[c]}
+        return [r for r in self.lab_rooms if r not in blocked]
+
+    def _locked_key(self, locked: dict) -> Tuple:
+        o, s, _, k = super()._locked_key(locked)
+        return (o, s, None, k)
+
+    def _assignment_var(self, assignment: dict):
+        store = self.store
+        if assignment['kind'] != 'P':
+            return self._locked_var(assignment)
+        s = store.slot_index.get(assignment['slot_id'])
+        c = store.slot_cluster[s] if s is not None else None
+        return store.y.get((store.offering_index.get(assignment['offering_id']), c, None))
+
+    def _room_cost(self, o: int, r: int) -> int:
+        room = self.input.rooms[r]
+        size = self.sizes[o]
+        if room['capacity'] < size:
+            cost = UNDERSIZED_COST + size - room['capacity']
+        else:
+            cost = room['capacity'] - size
+        needs = self.input.offerings[o].get('needs') or []
+        if needs:
+            tags = set(room.get('tags') or [])
+            cost += UNMET_NEED_COST * sum(1 for need in needs if need not in tags)
+        return cost
+
+    def _match_rooms(self, sessions: List[int], rooms: List[int], current: List = None,
+                     undersized: bool = False) -> List:
+        """Room per session (None if rooms ran out), minimising total _room_cost.
+
+        Arcs to rooms that are too small are only added on a second pass,
+        when rooms that fit cannot seat every session (labs, whose capacity
+        CP-SAT does not count, or locked overrides).
+        """
+        if not sessions or not rooms:
+            return [None] * len(sessions)
+        current = current or [None] * len(sessions)
+        flow = min_cost_flow.SimpleMinCostFlow()
+        source, sink = 0, 1
+        first_session, first_room = 2, 2 + len(sessions)
+        for i, o in enumerate(sessions):
+            flow.add_arc_with_capacity_and_unit_cost(source, first_session + i, 1, 0)
+            for j, r in enumerate(rooms):
+                if undersized or self.input.rooms[r]['capacity'] >= self.sizes[o]:
+                    cost = self._room_cost(o, r)
+                    if current[i] is not None and current[i] != r:
+                        cost += MOVED_ROOM_COST
+                    flow.add_arc_with_capacity_and_unit_cost(first_session + i, first_room + j, 1, cost)
+        for j in range(len(rooms)):
+            flow.add_arc_with_capacity_and_unit_cost(first_room + j, sink, 1, 0)
+        matched = min(len(sessions), len(rooms))
+        flow.set_node_supply(source, matched)
+        flow.set_node_supply(sink, -matched)
+        if flow.solve_max_flow_with_min_cost() != flow.OPTIMAL:
+            return [None] * len(sessions)
+        if flow.maximum_flow() < matched and not undersized:
+            return self._match_rooms(sessions, rooms, current, undersized=True)
+
+        result = [None] * len(sessions)
+        for arc in range(flow.num_arcs()):
+            tail, head = flow.tail(arc), flow.head(arc)
+            if flow.flow(arc) and first_session <= tail < first_room and head < first_room + len(rooms):
+                result[tail - first_session] = rooms[head - first_room]
+        return result
+
+    def _extract_assignments(self, value: Callable) -> List[dict]:
+        """Stage two: rooms for the slots chosen in a CP-SAT solution"""
+        start = time.perf_counter()
+        store = self.store
+        report = {'sessions': 0, 'unmatched': 0, 'undersized': 0, 'unmet_needs': 0}
+
+        # Locked lectures keep their own room
+        locked_rooms = {}
+        for locked in self.input.locked_assignments:
+            key = self._locked_key(locked)
+            r = store.room_index.get(locked['room_id'])
+            if key in store.x and r is not None:
+                locked_rooms[key] = r
+
+        by_slot: Dict[int, List[Tuple[int, int]]] = {}
+        placed = []
+        for (o, s, _, k), var in store.x.items():
+            if value(var) == 1:
+                if (o, s, None, k) in locked_rooms:
+                    placed.append((o, s, locked_rooms[(o, s, None, k)], k))
+                else:
+                    by_slot.setdefault(s, []).append((o, k))
+        blackouts = self.blackout_pairs()
+        for s, sessions in by_slot.items():
+            taken = {r for _, ls, r, _ in placed if ls == s} | {r for bs, r in blackouts if bs == s}
+            rooms = [r for r in self.class_rooms if r not in taken]
+            current = [self.current_rooms.get((o, s, KINDS[k])) for o, k in sessions]
+            for (o, k), r in zip(sessions, self._match_rooms([o for o, _ in sessions], rooms, current)):
+                placed.append((o, s, r, k))
+
+        assignments = []
+        for o, s, r, k in placed:
+            report['sessions'] += 1
+            if r is None:
+                report['unmatched'] += 1
+                continue
+            self._count_fit(report, o, r)
+            assignments.append({
+                'offering_id': store.offering_ids[o],
+                'slot_id': store.slot_ids[s],
+                'room_id': store.room_ids[r],
+                'kind': KINDS[k],
+                'is_locked': False
+            })
+
+        # Labs: one room per offering in each chosen cluster, held for all its slots
+        by_cluster: Dict[int, List[int]] = {}
+        for (o, c, _), var in store.y.items():
+            if value(var) == 1:
+                by_cluster.setdefault(c, []).append(o)
+        for c, offerings in by_cluster.items():
+            current = [self.current_rooms.get((o, store.cluster_slots[c][0], 'P')) for o in offerings]
+            for o, r in zip(offerings, self._match_rooms(offerings, self._lab_rooms(c), current)):
+                report['sessions'] += 1
+                if r is None:
+                    report['unmatched'] += 1
+                    continue
+                self._count_fit(report, o, r)
+                for s in store.cluster_slots[c]:
+                    assignments.append({
+                        'offering_id': store.offering_ids[o],
+                        'slot_id': store.slot_ids[s],
+                        'room_id': store.room_ids[r],
+                        'kind': 'P',
+                        'is_locked': False
+                    })
+
+        report['seconds'] = round(time.perf_counter() - start, 4)
+        self.matching_report = report
+        return assignments
+
+    def _count_fit(self, report: dict, o: int, r: int):
+        room = self.input.rooms[r]
+        if room['capacity'] < self.sizes[o]:
+            report['undersized'] += 1
+        tags = set(room.get('tags') or [])
+        report['unmet_needs'] += sum(1 for need in self.input.offerings[o].get('needs') or [] if need not in tags)
+
+    def solve(self, on_solution=None) -> SolverOutput:
+        output = super().solve(on_solution)
+        if 'model' in output.stats:
+            output.stats['room_matching'] = self.matching_report
+        return output
@@ -0,0 +1,130 @@
+"""Integer-indexed registry of the CP-SAT decision variables used by TimetableSolver"""
+
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from ortools.sat.python import cp_model
+
+KINDS = ('L', 'T', 'P')
+KIND_INDEX = {kind: k for k, kind in enumerate(KINDS)}
+
+
+class VariableStore:
+    """Holds the X (lecture/tutorial) and Y (lab cluster) variables.
+
+    Entities are interned to dense integer indices once, and every variable is
+    filed into the buckets the constraint families need at creation time, so
+    building a constraint is a direct lookup instead of a scan over all
+    variables. Indices map back to IDs through the ``*_ids`` lists, which means
+    IDs are never parsed out of variable names.
+    """
+
+    def __init__(self, model: cp_model.CpModel, offerings: List[dict],
+                 slots: List[dict], rooms: List[dict]):
+        self.model = model
+
+        self.offering_ids = [o['id'] for o in offerings]
+        self.slot_ids = [s['id'] for s in slots]
+        self.room_ids = [r['id'] for r in rooms]
+        self.offering_index = {oid: i for i, oid in enumerate(self.offering_ids)}
+        self.slot_index = {sid: i for i, sid in enumerate(self.slot_ids)}
+        self.room_index = {rid: i for i, rid in enumerate(self.room_ids)}
+
+        # Lab clusters, each a list of slot indices
+        self.cluster_names: List[str] = []
+        self.cluster_index: Dict[str, int] = {}
+        self.cluster_slots: List[List[int]] = []
+        self.slot_cluster: List[Optional[int]] = [None] * len(slots)
+        for s, slot in enumerate(slots):
+            name = slot.get('cluster')
+            if not name:
+                continue
+            if name not in self.cluster_index:
+                self.cluster_index[name] = len(self.cluster_names)
+                self.cluster_names.append(name)
+                self.cluster_slots.append([])
+            c = self.cluster_index[name]
+            self.cluster_slots[c].append(s)
+            self.slot_cluster[s] = c
+
+        # Teachers and sections are interned from the offerings that use them
+        self.teacher_ids: List[str] = []
+        self.section_ids: List[str] = []
+        self.teacher_index: Dict[str, int] = {}
+        self.section_index: Dict[str, int] = {}
+        self.offering_teacher: List[Optional[int]] = []
+        self.offering_section: List[int] = []
+        for offering in offerings:
+            teacher = offering.get('teacher')
+            self.offering_teacher.append(
+                self._intern(teacher['id'], self.teacher_ids, self.teacher_index) if teacher else None
+            )
+            self.offering_section.append(
+                self._intern(offering['section']['id'], self.section_ids, self.section_index)
+            )
+
+        # X[o, s, r, k]
+        self.x: Dict[Tuple[int, int, int, int], cp_model.IntVar] = {}
+        self.x_by_offering: Dict[int, List[Tuple[int, int, int, cp_model.IntVar]]] = defaultdict(list)
+        self.x_by_offering_kind: Dict[Tuple[int, int], List[cp_model.IntVar]] = defaultdict(list)
+        self.x_by_slot_room: Dict[Tuple[int, int], List[cp_model.IntVar]] = defaultdict(list)
+        self.x_by_teacher_slot: Dict[Tuple[int, int], List[cp_model.IntVar]] = defaultdict(list)
+        self.x_by_section_slot: Dict[Tuple[int, int], List[cp_model.IntVar]] = defaultdict(list)
+
+        # Y[o, c, r]
+        self.y: Dict[Tuple[int, int, int], cp_model.IntVar] = {}
+        self.y_by_offering: Dict[int, List[Tuple[int, int, cp_model.IntVar]]] = defaultdict(list)
+        self.y_by_cluster_room: Dict[Tuple[int, int], List[cp_model.IntVar]] = defaultdict(list)
+        self.y_by_teacher_cluster: Dict[Tuple[int, int], List[cp_model.IntVar]] = defaultdict(list)
+        self.y_by_section_cluster: Dict[Tuple[int, int], List[cp_model.IntVar]] = defaultdict(list)
+
+    @staticmethod
+    def _intern(key: str, ids: List[str], index: Dict[str, int]) -> int:
+        if key not in index:
+            index[key] = len(ids)
+            ids.append(key)
+        return index[key]
+
+    def add_x(self, o: int, s: int, r: int, k: int) -> cp_model.IntVar:
+        var = self.model.new_bool_var(f"X_{o}_{s}_{r}_{k}")
+        self.x[(o, s, r, k)] = var
+        self.x_by_offering[o].append((s, r, k, var))
+        self.x_by_offering_kind[(o, k)].append(var)
+        self.x_by_slot_room[(s, r)].append(var)
+        self.x_by_section_slot[(self.offering_section[o], s)].append(var)
+        t = self.offering_teacher[o]
+        if t is not None:
+            self.x_by_teacher_slot[(t, s)].append(var)
+        return var
+
+    def add_y(self, o: int, c: int, r: int) -> cp_model.IntVar:
+        var = self.model.new_bool_var(f"Y_{o}_{c}_{r}")
+        self.y[(o, c, r)] = var
+        self.y_by_offering[o].append((c, r, var))
+        self.y_by_cluster_room[(c, r)].append(var)
+        self.y_by_section_cluster[(self.offering_section[o], c)].append(var)
+        t = self.offering_teacher[o]
+        if t is not None:
+            self.y_by_teacher_cluster[(t, c)].append(var)
+        return var
+
+    # Occupancy: every variable (X or Y) that puts an entity into a slot
+
+    def teacher_slot_vars(self, t: int, s: int) -> List[cp_model.IntVar]:
+        c = self.slot_cluster[s]
+        labs = self.y_by_teacher_cluster.get((t, c), []) if c is not None else []
+        return self.x_by_teacher_slot.get((t, s), []) + labs
+
+    def section_slot_vars(self, sec: int, s: int) -> List[cp_model.IntVar]:
+        c = self.slot_cluster[s]
+        labs = self.y_by_section_cluster.get((sec, c), []) if c is not None else []
+        return self.x_by_section_slot.get((sec, s), []) + labs
+
+    def room_slot_vars(self, s: int, r: int) -> List[cp_model.IntVar]:
+        c = self.slot_cluster[s]
+        labs = self.y_by_cluster_room.get((c, r), []) if c is not None else []
+        return self.x_by_slot_room.get((s, r), []) + labs
+
+    @property
+    def num_variables(self) -> int:
+        return len(self.x) + len(self.y)